@@ -1,30 +1,43 @@
-"""Claude Code integration module."""
-
-# New modules - imported for registration
-from . import commands, conversation, hooks, tools
-from .agent_integration import AgentIntegration
-from .conversation import (
-    ConversationManager,
-    get_conversation_manager,
-    set_conversation_manager,
-)
-from .exceptions import (
-    ClaudeError,
-    ClaudeParsingError,
-    ClaudeProcessError,
-    ClaudeSessionError,
-    ClaudeTimeoutError,
-)
-from .facade import ClaudeIntegration
-from .integration import ClaudeProcessManager, ClaudeResponse, StreamUpdate
-from .monitor import ToolMonitor
-from .parser import OutputParser, ResponseFormatter
-from .session import (
-    ClaudeSession,
-    InMemorySessionStorage,
-    SessionManager,
-    SessionStorage,
-)
+"""Claude Code integration module.
+
+Public names are resolved lazily on first attribute access (PEP 562) so that
+importing the package, or a lightweight member such as ``ClaudeError``, does
+not pull in the Claude SDK, the MCP tool registry or the legacy integrations.
+"""
+
+import importlib
+from typing import Any, Dict, List
+
+# Public attribute name -> relative module that defines it
+_LAZY_ATTRS: Dict[str, str] = {
+    # Exceptions
+    "ClaudeError": ".exceptions",
+    "ClaudeParsingError": ".exceptions",
+    "ClaudeProcessError": ".exceptions",
+    "ClaudeSessionError": ".exceptions",
+    "ClaudeTimeoutError": ".exceptions",
+    # Main integration
+    "ClaudeIntegration": ".facade",
+    "AgentIntegration": ".agent_integration",
+    # Core components
+    "ClaudeProcessManager": ".integration",
+    "ClaudeResponse": ".integration",
+    "StreamUpdate": ".integration",
+    "SessionManager": ".session",
+    "SessionStorage": ".session",
+    "InMemorySessionStorage": ".session",
+    "ClaudeSession": ".session",
+    "ToolMonitor": ".monitor",
+    "OutputParser": ".parser",
+    "ResponseFormatter": ".parser",
+    # Conversation management
+    "ConversationManager": ".conversation",
+    "get_conversation_manager": ".conversation",
+    "set_conversation_manager": ".conversation",
+}
+
+# Subpackages/modules exposed as attributes of the package
+_LAZY_MODULES = ("tools", "hooks", "commands", "conversation")
 
 __all__ = [
     # Exceptions
@@ -57,3 +70,22 @@ __all__ = [
     "commands",
     "conversation",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    """Import public attributes on first access and cache them."""
+    if name in _LAZY_ATTRS:
+        module = importlib.import_module(_LAZY_ATTRS[name], __name__)
+        value = getattr(module, name)
+    elif name in _LAZY_MODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    """List lazily resolved attributes alongside the loaded ones."""
+    return sorted(set(globals()) | set(_LAZY_ATTRS) | set(_LAZY_MODULES))
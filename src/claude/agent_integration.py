@@ -12,10 +12,22 @@ Features:
 """
 
 import asyncio
+import inspect
 import os
 import uuid
 from dataclasses import dataclass, field
-from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from types import MappingProxyType
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+)
 
 import structlog
 
@@ -33,11 +45,15 @@ SDK_TYPE = "none"
 
 try:
     from claude_agent_sdk import (
+        AssistantMessage,
         CLIJSONDecodeError,
         CLINotFoundError,
         ClaudeAgentOptions,
         ClaudeSDKClient,
         ProcessError,
+        ResultMessage,
+        TextBlock,
+        ToolUseBlock,
     )
 
     SDK_AVAILABLE = True
@@ -45,10 +61,14 @@ try:
     logger.info("Using claude-agent-sdk")
 except ImportError:
     try:
-        from claude_code_sdk import (
+        from claude_code_sdk import (  # type: ignore[no-redef]
+            AssistantMessage,
             ClaudeCodeOptions,
             CLINotFoundError,
             ProcessError,
+            ResultMessage,
+            TextBlock,
+            ToolUseBlock,
         )
         from claude_code_sdk import query as sdk_query
 
@@ -59,7 +79,67 @@ except ImportError:
         logger.warning("No Claude SDK available - running in stub mode")
 
 
-@dataclass
+CLI_NOT_FOUND_MESSAGE = (
+    "Claude CLI not found. Please ensure Claude is installed:\n"
+    "  npm install -g @anthropic-ai/claude-code"
+)
+
+
+def _format_cli_not_found(error: Exception) -> str:
+    """Format a missing Claude CLI error with install instructions."""
+    return CLI_NOT_FOUND_MESSAGE
+
+
+def _format_process_error(error: Exception) -> str:
+    """Format a Claude CLI process failure."""
+    return "Claude process error: " + str(error)
+
+
+def _format_json_decode_error(error: Exception) -> str:
+    """Format an unparseable Claude CLI response."""
+    return "Failed to parse Claude response: " + str(error)
+
+
+# Maximum number of sessions close_all() tears down concurrently
+CLOSE_ALL_CONCURRENCY = 64
+
+# Text responses arriving within this many seconds of the last text sent on,
+# up to the character cap, are merged before reaching the stream callback
+TEXT_COALESCE_WINDOW_SECONDS = 0.25
+TEXT_COALESCE_MAX_CHARS = 4096
+
+
+def _merge_text_responses(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine buffered text responses into a single text response."""
+    if len(responses) == 1:
+        return responses[0]
+    return {
+        "type": "text",
+        "content": "\n".join(r.get("content") or "" for r in responses),
+    }
+
+
+# SDK exception type -> user-facing message formatter, fixed once the SDK
+# import above has resolved
+_ERROR_FORMATTERS: Mapping[type, Callable[[Exception], str]] = MappingProxyType({})
+if SDK_TYPE == "agent":
+    _ERROR_FORMATTERS = MappingProxyType(
+        {
+            CLINotFoundError: _format_cli_not_found,
+            ProcessError: _format_process_error,
+            CLIJSONDecodeError: _format_json_decode_error,
+        }
+    )
+elif SDK_TYPE == "code":
+    _ERROR_FORMATTERS = MappingProxyType(
+        {
+            CLINotFoundError: _format_cli_not_found,
+            ProcessError: _format_process_error,
+        }
+    )
+
+
+@dataclass(slots=True)
 class AgentResponse:
     """Response from Claude Agent SDK."""
 
@@ -73,7 +153,7 @@ class AgentResponse:
     tools_used: List[Dict[str, Any]] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class StreamUpdate:
     """Streaming update from Agent SDK."""
 
@@ -112,13 +192,30 @@ class AgentIntegration:
         self._options: Optional[Any] = None
         self._initialized = False
 
+        # SDK_TYPE is fixed at import time, so resolve the per-SDK
+        # implementations once instead of branching on every call
+        self._message_converters: Dict[type, Callable[[Any], Dict[str, Any]]] = {}
+        if SDK_TYPE == "agent":
+            self._query_impl = self._query_agent_sdk
+            self._close_impl = self._close_agent_client
+            self._message_converters = {
+                AssistantMessage: self._convert_assistant_message,
+                ResultMessage: self._convert_result_message,
+            }
+        elif SDK_TYPE == "code":
+            self._query_impl = self._query_code_sdk
+            self._close_impl = self._release_session_data
+        else:
+            self._query_impl = self._query_stub
+            self._close_impl = self._release_session_data
+
         # Set up environment for API key if provided
         if config.anthropic_api_key_str:
             os.environ["ANTHROPIC_API_KEY"] = config.anthropic_api_key_str
             logger.info("Using provided API key for Claude SDK authentication")
 
     async def initialize(self) -> None:
-        """Initialize the SDK and create options."""
+        """Initialize the integration; SDK options are built on first query."""
         if self._initialized:
             return
 
@@ -128,11 +225,21 @@ class AgentIntegration:
             sdk_available=SDK_AVAILABLE,
         )
 
-        if SDK_AVAILABLE:
-            self._options = self._create_options()
-
         self._initialized = True
 
+    def _get_options(self) -> Any:
+        """Return SDK options, building them on first use.
+
+        Building the options imports the Telegram tool registry and security
+        hooks, so it is deferred until a query actually needs a client.
+
+        Returns:
+            Configured SDK options, or None in stub mode
+        """
+        if self._options is None and SDK_AVAILABLE:
+            self._options = self._create_options()
+        return self._options
+
     def _create_options(self) -> Any:
         """Create ClaudeAgentOptions with tools and hooks.
 
@@ -221,30 +328,33 @@ class AgentIntegration:
         Returns:
             ClaudeSDKClient instance or session data for the user
         """
-        if user_id not in self.clients:
-            if SDK_TYPE == "agent":
-                # New SDK: create ClaudeSDKClient
-                client = ClaudeSDKClient(options=self._options)
-                await client.__aenter__()
-                self.clients[user_id] = client
-                logger.info("Created new Agent SDK client", user_id=user_id)
-            else:
-                # Old SDK or stub: use session dictionary
-                self.clients[user_id] = {
-                    "session_id": str(uuid.uuid4()),
-                    "messages": [],
-                    "created_at": asyncio.get_event_loop().time(),
-                }
-                logger.info("Created new session", user_id=user_id)
-
-        return self.clients.get(user_id)
+        client = self.clients.get(user_id)
+        if client is not None:
+            return client
+
+        if SDK_TYPE == "agent":
+            # New SDK: create ClaudeSDKClient
+            client = ClaudeSDKClient(options=self._get_options())
+            await client.__aenter__()
+            logger.info("Created new Agent SDK client", user_id=user_id)
+        else:
+            # Old SDK or stub: use session dictionary
+            client = {
+                "session_id": str(uuid.uuid4()),
+                "messages": [],
+                "created_at": asyncio.get_running_loop().time(),
+            }
+            logger.info("Created new session", user_id=user_id)
+
+        self.clients[user_id] = client
+        return client
 
     async def query(
         self,
         user_id: int,
         prompt: str,
         stream_callback: Optional[Callable[[StreamUpdate], Any]] = None,
-    ) -> AsyncIterator[Dict[str, Any]]:
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         """Send a query and stream responses.
 
         Args:
@@ -253,36 +363,29 @@ class AgentIntegration:
             stream_callback: Optional callback for streaming updates
 
         Yields:
-            Response messages from Claude
+            Response messages from Claude as plain dicts keyed by ``type``
+            ('text', 'tool_use', 'complete' or 'error'). Each dict is a
+            fresh object owned by the consumer, which may keep it.
         """
         if not self._initialized:
             await self.initialize()
 
-        start_time = asyncio.get_event_loop().time()
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+
+        # A bound logger rather than structlog contextvars: a caller may stop
+        # iterating early, leaving this generator unfinished, and bindings
+        # made here would then stay in the caller's context
+        log = logger.bind(user_id=user_id, sdk_type=SDK_TYPE)
 
         try:
-            if SDK_TYPE == "agent":
-                async for response in self._query_agent_sdk(
-                    user_id, prompt, stream_callback
-                ):
-                    yield response
-            elif SDK_TYPE == "code":
-                async for response in self._query_code_sdk(
-                    user_id, prompt, stream_callback
-                ):
-                    yield response
-            else:
-                # Stub mode
-                yield {
-                    "type": "text",
-                    "content": f"[SDK stub] No SDK available. Received: {prompt}",
-                }
+            async for response in self._query_impl(user_id, prompt, stream_callback):
+                yield response
 
         except asyncio.TimeoutError:
-            duration_ms = int((asyncio.get_event_loop().time() - start_time) * 1000)
-            logger.error(
+            duration_ms = int((loop.time() - start_time) * 1000)
+            log.error(
                 "Query timed out",
-                user_id=user_id,
                 timeout=self.config.claude_timeout_seconds,
                 duration_ms=duration_ms,
             )
@@ -293,11 +396,10 @@ class AgentIntegration:
             }
 
         except Exception as e:
-            duration_ms = int((asyncio.get_event_loop().time() - start_time) * 1000)
+            duration_ms = int((loop.time() - start_time) * 1000)
             error_type = type(e).__name__
-            logger.error(
+            log.error(
                 "Query failed",
-                user_id=user_id,
                 error=str(e),
                 error_type=error_type,
                 duration_ms=duration_ms,
@@ -313,7 +415,7 @@ class AgentIntegration:
         user_id: int,
         prompt: str,
         stream_callback: Optional[Callable[[StreamUpdate], Any]] = None,
-    ) -> AsyncIterator[Dict[str, Any]]:
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         """Query using claude-agent-sdk (ClaudeSDKClient).
 
         Args:
@@ -325,13 +427,13 @@ class AgentIntegration:
             Response messages
         """
         client = await self._get_client(user_id)
+        dispatch = self._bind_stream_callback(stream_callback)
 
         # Apply timeout to entire query
+        timeout = self.config.claude_timeout_seconds
+        deadline = asyncio.get_running_loop().time() + timeout
         try:
-            await asyncio.wait_for(
-                client.query(prompt),
-                timeout=self.config.claude_timeout_seconds,
-            )
+            await self._with_deadline(client.query(prompt), deadline)
         except asyncio.TimeoutError:
             raise ClaudeTimeoutError(
                 f"Query timed out after {self.config.claude_timeout_seconds}s"
@@ -340,39 +442,105 @@ class AgentIntegration:
         # Stream responses from SDK
         # Note: Tool execution timeouts are handled internally by the SDK
         # via ClaudeAgentOptions configuration
-        async for msg in client.receive_response():
-            # Log tool usage for monitoring
-            if hasattr(msg, "tool_use"):
-                tool_name = getattr(msg.tool_use, "name", "unknown")
-                logger.debug("Tool execution in progress", tool=tool_name, user_id=user_id)
+        async for response in self._coalesce_text(
+            self._receive_agent_responses(client, user_id)
+        ):
+            # Call streaming callback if provided
+            if dispatch is not None:
+                await dispatch(
+                    StreamUpdate(
+                        type=response.get("type", "text"),
+                        content=response.get("content"),
+                        tool_name=response.get("tool_name"),
+                        tool_input=response.get("tool_input"),
+                    )
+                )
+
+            yield response
 
-            # Convert to dict format
+    async def _receive_agent_responses(
+        self, client: Any, user_id: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Convert a ClaudeSDKClient's response stream to response dicts.
+
+        Args:
+            client: ClaudeSDKClient that has been sent a query
+            user_id: Telegram user ID, for logging
+
+        Yields:
+            Non-empty response dictionaries
+        """
+        async for msg in client.receive_response():
             response = self._convert_message_to_dict(msg)
+            if not response:
+                continue
 
-            # Call streaming callback if provided
-            if stream_callback and response:
-                update = StreamUpdate(
-                    type=response.get("type", "text"),
-                    content=response.get("content"),
-                    tool_name=response.get("tool_name"),
-                    tool_input=response.get("tool_input"),
+            # Log tool usage for monitoring
+            if response.get("type") == "tool_use":
+                logger.debug(
+                    "Tool execution in progress",
+                    tool=response["tool_name"],
+                    user_id=user_id,
                 )
-                try:
-                    result = stream_callback(update)
-                    if asyncio.iscoroutine(result):
-                        await result
-                except Exception as e:
-                    logger.warning("Stream callback failed", error=str(e))
 
-            if response:
+            yield response
+
+    async def _coalesce_text(
+        self, responses: AsyncIterator[Dict[str, Any]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Merge runs of consecutive text responses into fewer, larger ones.
+
+        Each downstream text response typically becomes a Telegram message
+        edit, so bursts are combined. A text response arriving
+        TEXT_COALESCE_WINDOW_SECONDS or more after the last text was passed
+        on, such as the first one in the stream, is passed on immediately,
+        so the user sees it without waiting for another message. Text
+        arriving sooner is buffered until a non-text response arrives,
+        TEXT_COALESCE_MAX_CHARS accumulate, a later text response arrives
+        after the window, or the stream ends. Parts are joined with
+        newlines, matching how the facade assembles the final content.
+
+        Args:
+            responses: Response dictionaries in stream order
+
+        Yields:
+            Response dictionaries with adjacent text merged
+        """
+        loop = asyncio.get_running_loop()
+        buffered: List[Dict[str, Any]] = []
+        buffered_chars = 0
+        last_text_at = float("-inf")
+
+        async for response in responses:
+            if response.get("type") != "text":
+                if buffered:
+                    yield _merge_text_responses(buffered)
+                    buffered = []
+                    buffered_chars = 0
                 yield response
+                continue
+
+            now = loop.time()
+            buffered.append(response)
+            buffered_chars += len(response.get("content") or "")
+            if (
+                buffered_chars >= TEXT_COALESCE_MAX_CHARS
+                or now - last_text_at >= TEXT_COALESCE_WINDOW_SECONDS
+            ):
+                yield _merge_text_responses(buffered)
+                buffered = []
+                buffered_chars = 0
+                last_text_at = now
+
+        if buffered:
+            yield _merge_text_responses(buffered)
 
     async def _query_code_sdk(
         self,
         user_id: int,
         prompt: str,
         stream_callback: Optional[Callable[[StreamUpdate], Any]] = None,
-    ) -> AsyncIterator[Dict[str, Any]]:
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         """Query using legacy claude-code-sdk.
 
         Args:
@@ -384,52 +552,45 @@ class AgentIntegration:
             Response messages
         """
         session_data = await self._get_client(user_id)
-        content_parts = []
-        tools_used = []
-
+        dispatch = self._bind_stream_callback(stream_callback)
+        # Text is kept as the str objects already yielded to the caller and
+        # only joined once, when a ResultMessage needs the full content
+        content_parts: List[str] = []
+        tools_used: List[Dict[str, Any]] = []
+        append_text = content_parts.append
+        append_tool = tools_used.append
+
+        timeout = self.config.claude_timeout_seconds
+        deadline = asyncio.get_running_loop().time() + timeout
         try:
-            async for message in asyncio.wait_for(
-                self._execute_code_sdk_query(prompt),
-                timeout=self.config.claude_timeout_seconds,
+            async for message in self._iter_with_deadline(
+                self._execute_code_sdk_query(prompt), deadline
             ):
-                # Handle AssistantMessage
-                if hasattr(message, "content"):
-                    msg_content = getattr(message, "content", [])
-                    if isinstance(msg_content, list):
-                        for block in msg_content:
-                            if hasattr(block, "text"):
-                                text = block.text
-                                content_parts.append(text)
-                                if stream_callback:
-                                    update = StreamUpdate(type="text", content=text)
-                                    try:
-                                        result = stream_callback(update)
-                                        if asyncio.iscoroutine(result):
-                                            await result
-                                    except Exception as e:
-                                        logger.warning(
-                                            "Stream callback failed", error=str(e)
-                                        )
-                                yield {"type": "text", "content": text}
-
-                            elif hasattr(block, "tool_name"):
-                                tool_info = {
-                                    "name": getattr(block, "tool_name", "unknown"),
-                                    "input": getattr(block, "tool_input", {}),
-                                }
-                                tools_used.append(tool_info)
-                                yield {
-                                    "type": "tool_use",
-                                    "tool_name": tool_info["name"],
-                                    "tool_input": tool_info["input"],
-                                }
-
-                # Handle ResultMessage
-                if hasattr(message, "total_cost_usd"):
+                message_type = type(message)
+
+                if message_type is AssistantMessage:
+                    for block in message.content:
+                        if isinstance(block, TextBlock):
+                            text = block.text
+                            append_text(text)
+                            if dispatch is not None:
+                                await dispatch(StreamUpdate(type="text", content=text))
+                            yield {"type": "text", "content": text}
+
+                        elif isinstance(block, ToolUseBlock):
+                            tool_info = {"name": block.name, "input": block.input}
+                            append_tool(tool_info)
+                            yield {
+                                "type": "tool_use",
+                                "tool_name": block.name,
+                                "tool_input": block.input,
+                            }
+
+                elif message_type is ResultMessage:
                     yield {
                         "type": "complete",
                         "content": "\n".join(content_parts),
-                        "cost": getattr(message, "total_cost_usd", 0.0),
+                        "cost": message.total_cost_usd,
                         "session_id": session_data.get("session_id", ""),
                         "tools_used": tools_used,
                     }
@@ -439,7 +600,140 @@ class AgentIntegration:
                 f"Query timed out after {self.config.claude_timeout_seconds}s"
             )
 
-    async def _execute_code_sdk_query(self, prompt: str) -> AsyncIterator[Any]:
+    async def _with_deadline(self, awaitable: Awaitable[Any], deadline: float) -> Any:
+        """Await ``awaitable`` in the current task, cancelling it at ``deadline``.
+
+        A ``loop.call_at`` timer cancels the current task if the deadline
+        passes, so no extra Task is created and several awaits can share one
+        absolute deadline. The timer is only armed while awaiting here, never
+        while the caller runs other code.
+
+        Args:
+            awaitable: Coroutine or future to run
+            deadline: Absolute ``loop.time()`` value to give up at
+
+        Returns:
+            Result of the awaitable
+
+        Raises:
+            asyncio.TimeoutError: If the deadline passes first
+        """
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        if task is None:
+            # Not running inside a task, so there is nothing to cancel
+            return await awaitable
+        expired = False
+
+        def expire() -> None:
+            nonlocal expired
+            expired = True
+            task.cancel()
+
+        handle = loop.call_at(deadline, expire)
+        try:
+            return await awaitable
+        except asyncio.CancelledError:
+            if not expired:
+                raise
+            # Withdraw our own cancellation request (Python 3.11+), so it is
+            # not mistaken for one from outside
+            uncancel = getattr(task, "uncancel", None)
+            if uncancel is not None:
+                uncancel()
+            raise asyncio.TimeoutError from None
+        finally:
+            handle.cancel()
+
+    async def _iter_with_deadline(
+        self, messages: AsyncGenerator[Any, None], deadline: float
+    ) -> AsyncIterator[Any]:
+        """Iterate an async generator, bounding the stream by ``deadline``.
+
+        The generator is resumed directly from the consuming task, as the
+        SDK's anyio-based streams require.
+
+        Args:
+            messages: Async generator to consume
+            deadline: Absolute ``loop.time()`` value to give up at
+
+        Yields:
+            Items from ``messages``
+
+        Raises:
+            asyncio.TimeoutError: If the deadline passes before the stream ends
+        """
+        try:
+            while True:
+                try:
+                    message = await self._with_deadline(messages.__anext__(), deadline)
+                except StopAsyncIteration:
+                    return
+                yield message
+        finally:
+            await messages.aclose()
+
+    def _bind_stream_callback(
+        self, stream_callback: Optional[Callable[[StreamUpdate], Any]]
+    ) -> Optional[Callable[[StreamUpdate], Awaitable[None]]]:
+        """Wrap a stream callback into an awaitable, error-isolating dispatcher.
+
+        Whether the callback is a coroutine function is decided once per query
+        rather than by inspecting its return value for every streamed chunk.
+
+        Args:
+            stream_callback: Optional sync or async streaming callback
+
+        Returns:
+            Dispatcher to await per update, or None if there is no callback
+        """
+        if stream_callback is None:
+            return None
+
+        if inspect.iscoroutinefunction(stream_callback):
+
+            async def dispatch(update: StreamUpdate) -> None:
+                try:
+                    await stream_callback(update)
+                except Exception as e:
+                    logger.warning("Stream callback failed", error=str(e))
+
+        else:
+
+            async def dispatch(update: StreamUpdate) -> None:
+                try:
+                    result = stream_callback(update)
+                    # Callables that are not coroutine functions may still
+                    # return an awaitable (e.g. objects with async __call__)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    logger.warning("Stream callback failed", error=str(e))
+
+        return dispatch
+
+    async def _query_stub(
+        self,
+        user_id: int,
+        prompt: str,
+        stream_callback: Optional[Callable[[StreamUpdate], Any]] = None,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Answer queries in stub mode when no SDK is installed.
+
+        Args:
+            user_id: Telegram user ID
+            prompt: User's message
+            stream_callback: Optional streaming callback (unused)
+
+        Yields:
+            A single placeholder text message
+        """
+        yield {
+            "type": "text",
+            "content": f"[SDK stub] No SDK available. Received: {prompt}",
+        }
+
+    async def _execute_code_sdk_query(self, prompt: str) -> AsyncGenerator[Any, None]:
         """Execute query with legacy claude-code-sdk.
 
         Args:
@@ -448,7 +742,7 @@ class AgentIntegration:
         Yields:
             SDK messages
         """
-        async for msg in sdk_query(prompt=prompt, options=self._options):
+        async for msg in sdk_query(prompt=prompt, options=self._get_options()):
             yield msg
 
     def _convert_message_to_dict(self, msg: Any) -> Optional[Dict[str, Any]]:
@@ -463,6 +757,11 @@ class AgentIntegration:
         if msg is None:
             return None
 
+        # Known SDK message classes are converted without attribute probing
+        converter = self._message_converters.get(type(msg))
+        if converter is not None:
+            return converter(msg) or None
+
         result: Dict[str, Any] = {}
 
         # Handle text content
@@ -494,6 +793,51 @@ class AgentIntegration:
 
         return result if result else None
 
+    def _convert_assistant_message(self, msg: Any) -> Dict[str, Any]:
+        """Convert an Agent SDK AssistantMessage.
+
+        Text blocks are joined into a single text message. A message that
+        carries no text but requests a tool is reported as ``tool_use``.
+
+        Args:
+            msg: AssistantMessage instance
+
+        Returns:
+            Dictionary representation, empty if nothing to report
+        """
+        texts = []
+        tool_block = None
+        for block in msg.content:
+            if isinstance(block, TextBlock):
+                texts.append(block.text)
+            elif tool_block is None and isinstance(block, ToolUseBlock):
+                tool_block = block
+
+        if texts:
+            return {"type": "text", "content": "\n".join(texts)}
+        if tool_block is not None:
+            return {
+                "type": "tool_use",
+                "tool_name": tool_block.name,
+                "tool_input": tool_block.input,
+            }
+        return {}
+
+    def _convert_result_message(self, msg: Any) -> Dict[str, Any]:
+        """Convert an Agent SDK ResultMessage.
+
+        Args:
+            msg: ResultMessage instance
+
+        Returns:
+            Completion dictionary with cost and session ID
+        """
+        return {
+            "type": "complete",
+            "cost": msg.total_cost_usd,
+            "session_id": msg.session_id,
+        }
+
     def _format_error_message(self, error: Exception) -> str:
         """Format error into user-friendly message.
 
@@ -503,29 +847,13 @@ class AgentIntegration:
         Returns:
             Formatted error message
         """
-        error_type = type(error).__name__
+        # Walk the MRO so subclasses of SDK errors get their base formatter
+        for error_cls in type(error).__mro__:
+            formatter = _ERROR_FORMATTERS.get(error_cls)
+            if formatter is not None:
+                return formatter(error)
 
-        if SDK_AVAILABLE and SDK_TYPE == "agent":
-            if isinstance(error, CLINotFoundError):
-                return (
-                    "Claude CLI not found. Please ensure Claude is installed:\n"
-                    "  npm install -g @anthropic-ai/claude-code"
-                )
-            elif isinstance(error, ProcessError):
-                return f"Claude process error: {str(error)}"
-            elif isinstance(error, CLIJSONDecodeError):
-                return f"Failed to parse Claude response: {str(error)}"
-
-        elif SDK_AVAILABLE and SDK_TYPE == "code":
-            if isinstance(error, CLINotFoundError):
-                return (
-                    "Claude CLI not found. Please ensure Claude is installed:\n"
-                    "  npm install -g @anthropic-ai/claude-code"
-                )
-            elif isinstance(error, ProcessError):
-                return f"Claude process error: {str(error)}"
-
-        return f"Error ({error_type}): {str(error)}"
+        return f"Error ({type(error).__name__}): {str(error)}"
 
     async def close_session(self, user_id: int) -> None:
         """Close a user's session and cleanup resources.
@@ -533,26 +861,51 @@ class AgentIntegration:
         Args:
             user_id: Telegram user ID
         """
-        if user_id in self.clients:
-            client = self.clients.pop(user_id)
+        client = self.clients.pop(user_id, None)
+        if client is None:
+            return
 
-            if SDK_TYPE == "agent" and hasattr(client, "__aexit__"):
-                try:
-                    await client.__aexit__(None, None, None)
-                except Exception as e:
-                    logger.warning("Error closing SDK client", error=str(e))
+        await self._close_impl(client)
+        logger.info("Closed SDK client session", user_id=user_id)
+
+    async def _close_agent_client(self, client: Any) -> None:
+        """Exit a ClaudeSDKClient's async context.
+
+        Args:
+            client: ClaudeSDKClient removed from the clients map
+        """
+        if hasattr(client, "__aexit__"):
+            try:
+                await client.__aexit__(None, None, None)
+            except Exception as e:
+                logger.warning("Error closing SDK client", error=str(e))
 
-            logger.info("Closed SDK client session", user_id=user_id)
+    async def _release_session_data(self, client: Any) -> None:
+        """Release legacy/stub session data (nothing to tear down).
+
+        Args:
+            client: Session dictionary removed from the clients map
+        """
 
     async def close_all(self) -> None:
-        """Close all active sessions concurrently."""
-        user_ids = list(self.clients.keys())
+        """Close all active sessions concurrently with bounded fan-out."""
+        user_ids = list(self.clients)
         if user_ids:
-            # Close all sessions concurrently for faster shutdown
-            await asyncio.gather(
-                *(self.close_session(uid) for uid in user_ids),
-                return_exceptions=True,
-            )
+            # A fixed pool of workers drains a shared iterator, so at most
+            # CLOSE_ALL_CONCURRENCY closes (and tasks) are in flight at once
+            pending = iter(user_ids)
+
+            async def close_worker() -> None:
+                for uid in pending:
+                    try:
+                        await self.close_session(uid)
+                    except Exception as e:
+                        logger.warning(
+                            "Error closing session", user_id=uid, error=str(e)
+                        )
+
+            workers = min(CLOSE_ALL_CONCURRENCY, len(user_ids))
+            await asyncio.gather(*(close_worker() for _ in range(workers)))
         logger.info("Closed all SDK client sessions", count=len(user_ids))
 
     def get_active_session_count(self) -> int:
@@ -6,8 +6,9 @@ to prevent race conditions from rapid command submissions.
 
 import asyncio
 import re
+import sys
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Mapping, Optional, Sequence, Set, Union
 
 import structlog
 
@@ -18,7 +19,34 @@ logger = structlog.get_logger(__name__)
 # Pattern to match slash commands
 # Matches: /word.word, /word-word, /word_word patterns
 # Does NOT match: /help, /start, /status (single word commands - these are bot commands)
-SLASH_COMMAND_PATTERN = re.compile(r"^/([a-zA-Z0-9]+[.\-_][a-zA-Z0-9.\-_]+)\s*(.*)?$")
+# Used with match(), so it is anchored at the start; with DOTALL the greedy
+# arguments group consumes the rest of the message, including newlines.
+SLASH_COMMAND_PATTERN = re.compile(
+    r"/([a-zA-Z0-9]+[.\-_][a-zA-Z0-9.\-_]+)\s*(.*)", re.ASCII | re.DOTALL
+)
+
+# Prefix that decides whether SLASH_COMMAND_PATTERN matches: its trailing
+# ``\s*(.*)`` accepts anything, so detection only needs the command head and
+# never scans the (possibly multi-kilobyte) arguments.
+SLASH_COMMAND_HEAD_PATTERN = re.compile(r"/[a-zA-Z0-9]+[.\-_][a-zA-Z0-9.\-_]", re.ASCII)
+
+
+def _match_slash_command(message: str) -> Optional["re.Match[str]"]:
+    """Match a message against the slash command pattern.
+
+    Plain chat text is rejected with a ``startswith`` check before the regex
+    engine runs, since most messages are not slash commands.
+
+    Args:
+        message: Message text
+
+    Returns:
+        Regex match or None
+    """
+    stripped = message.strip()
+    if not stripped.startswith("/"):
+        return None
+    return SLASH_COMMAND_PATTERN.match(stripped)
 
 
 def is_slash_command(message: str) -> bool:
@@ -33,7 +61,7 @@ def is_slash_command(message: str) -> bool:
     Returns:
         True if message is a slash command
     """
-    return bool(SLASH_COMMAND_PATTERN.match(message.strip()))
+    return SLASH_COMMAND_HEAD_PATTERN.match(message.lstrip()) is not None
 
 
 def parse_slash_command(message: str) -> Optional[Dict[str, str]]:
@@ -45,11 +73,12 @@ def parse_slash_command(message: str) -> Optional[Dict[str, str]]:
     Returns:
         Dict with 'command' and 'arguments' or None if not a command
     """
-    match = SLASH_COMMAND_PATTERN.match(message.strip())
+    match = _match_slash_command(message)
     if not match:
         return None
 
-    command = match.group(1)
+    # Interned so the loader's dict lookup matches its keys by identity
+    command = sys.intern(match.group(1))
     arguments = match.group(2) or ""
 
     return {
@@ -70,31 +99,37 @@ class CommandExecutor:
 
     def __init__(
         self,
-        commands_dir: Optional[Path] = None,
+        commands_dir: Optional[Union[Path, Mapping[str, str]]] = None,
         enable_queue: bool = True,
     ) -> None:
         """Initialize the command executor.
 
         Args:
-            commands_dir: Path to commands directory
+            commands_dir: Path to commands directory, or a mapping of command
+                name to template
             enable_queue: Enable sequential execution queue
         """
         self.loader = SlashCommandLoader(commands_dir)
         self.enable_queue = enable_queue
         self._queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
-        self._processing: Dict[int, bool] = {}  # user_id -> is_processing
-        self._lock = asyncio.Lock()
+        # user_ids with a command in progress. Checked and updated without a
+        # lock: there is no await between the membership test and the add,
+        # so the check-and-set cannot interleave with another coroutine.
+        self._processing: Set[int] = set()
 
     async def process_message(
         self,
         message: str,
         user_id: Optional[int] = None,
+        parsed: Optional[Dict[str, str]] = None,
     ) -> Dict[str, Any]:
         """Process a message, detecting and expanding slash commands.
 
         Args:
             message: Message text
             user_id: Optional user ID for queue management
+            parsed: Result of ``parse_slash_command(message)``, if the caller
+                already has it; the message is then not parsed again
 
         Returns:
             Result dict with:
@@ -115,7 +150,8 @@ class CommandExecutor:
         }
 
         # Check if it's a slash command
-        parsed = parse_slash_command(message)
+        if parsed is None:
+            parsed = parse_slash_command(message)
         if not parsed:
             return result
 
@@ -125,14 +161,13 @@ class CommandExecutor:
 
         # Check if user has command in progress
         if self.enable_queue and user_id is not None:
-            async with self._lock:
-                if self._processing.get(user_id, False):
-                    result["error"] = (
-                        "A command is already in progress. "
-                        "Please wait for it to complete."
-                    )
-                    return result
-                self._processing[user_id] = True
+            if user_id in self._processing:
+                result["error"] = (
+                    "A command is already in progress. "
+                    "Please wait for it to complete."
+                )
+                return result
+            self._processing.add(user_id)
 
         try:
             # Expand the command
@@ -167,8 +202,7 @@ class CommandExecutor:
         finally:
             # Clear processing flag
             if self.enable_queue and user_id is not None:
-                async with self._lock:
-                    self._processing[user_id] = False
+                self._processing.discard(user_id)
 
         return result
 
@@ -181,32 +215,23 @@ class CommandExecutor:
         Returns:
             Formatted error message
         """
-        lines = [
-            f"Unknown command: `/{error.command}`",
-            "",
-            "**Available commands:**",
-        ]
-
-        if error.available_commands:
-            for cmd in sorted(error.available_commands):
-                lines.append(f"  • `/{cmd}`")
-        else:
-            lines.append("  (no commands discovered)")
-
-        lines.extend(
-            [
+        # The loader keeps the "available commands" block prebuilt
+        return "\n".join(
+            (
+                f"Unknown command: `/{error.command}`",
+                "",
+                "**Available commands:**",
+                *self.loader.formatted_command_lines,
                 "",
                 "Commands are loaded from `.claude/commands/*.md`",
-            ]
+            )
         )
 
-        return "\n".join(lines)
-
-    def list_commands(self) -> List[str]:
+    def list_commands(self) -> Sequence[str]:
         """List all available commands.
 
         Returns:
-            List of command names
+            Sorted command names
         """
         return self.loader.list_commands()
 
@@ -221,9 +246,9 @@ class CommandExecutor:
         """
         return self.loader.has_command(command)
 
-    def reload_commands(self) -> None:
-        """Reload commands from directory."""
-        self.loader.reload()
+    async def reload_commands(self) -> None:
+        """Reload commands from directory without blocking the event loop."""
+        await self.loader.reload_async()
 
     async def mark_complete(self, user_id: int) -> None:
         """Mark a user's command as complete.
@@ -231,8 +256,7 @@ class CommandExecutor:
         Args:
             user_id: User ID
         """
-        async with self._lock:
-            self._processing[user_id] = False
+        self._processing.discard(user_id)
 
     def is_user_processing(self, user_id: int) -> bool:
         """Check if user has a command in progress.
@@ -243,15 +267,24 @@ class CommandExecutor:
         Returns:
             True if user has command in progress
         """
-        return self._processing.get(user_id, False)
+        return user_id in self._processing
 
 
 # Module-level convenience functions
+
+# Executor installed with set_executor(); returned for the default directory
 _default_executor: Optional[CommandExecutor] = None
 
+# Shared executor per commands directory. Never evicted: each executor holds
+# the per-user busy state that stops concurrent commands.
+_executors: Dict[Optional[Path], CommandExecutor] = {}
+
 
 def get_executor(commands_dir: Optional[Path] = None) -> CommandExecutor:
-    """Get or create the default command executor.
+    """Get or create the command executor for a commands directory.
+
+    Each distinct directory gets its own shared executor, so a later call
+    with a different directory no longer receives the first one created.
 
     Args:
         commands_dir: Optional commands directory path
@@ -259,10 +292,12 @@ def get_executor(commands_dir: Optional[Path] = None) -> CommandExecutor:
     Returns:
         CommandExecutor instance
     """
-    global _default_executor
-    if _default_executor is None:
-        _default_executor = CommandExecutor(commands_dir)
-    return _default_executor
+    if commands_dir is None and _default_executor is not None:
+        return _default_executor
+    executor = _executors.get(commands_dir)
+    if executor is None:
+        executor = _executors[commands_dir] = CommandExecutor(commands_dir)
+    return executor
 
 
 def set_executor(executor: CommandExecutor) -> None:
@@ -4,92 +4,204 @@ Discovers and loads command templates from .claude/commands/ directory,
 enabling Claude Code workflows (speckit, ralph-wiggum) from Telegram.
 """
 
+import asyncio
+import os
+import sys
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Mapping, Optional, Sequence, Set, Tuple, Union
 
 import structlog
 
 logger = structlog.get_logger(__name__)
 
+# Placeholder in command templates replaced by the command's arguments
+ARGUMENTS_PLACEHOLDER = "$ARGUMENTS"
+
+# Names found by a directory scan, and name -> (template, (mtime_ns, size))
+# for the templates that had to be read
+_ScanResult = Tuple[Set[str], Dict[str, Tuple[str, Tuple[int, int]]]]
+
 
 class UnknownCommandError(Exception):
     """Raised when an unknown slash command is requested."""
 
-    def __init__(self, command: str, available_commands: List[str]) -> None:
+    def __init__(self, command: str, available_commands: Sequence[str]) -> None:
         """Initialize with command name and available commands.
 
         Args:
             command: The unknown command name
-            available_commands: List of available command names
+            available_commands: Sorted available command names
         """
         self.command = command
         self.available_commands = available_commands
-        super().__init__(
-            f"Unknown command: {command}. "
-            f"Available commands: {', '.join(available_commands) or 'none'}"
+        super().__init__(command)
+
+    def __str__(self) -> str:
+        """Build the message on demand; callers often only read attributes."""
+        return (
+            f"Unknown command: {self.command}. "
+            f"Available commands: {', '.join(self.available_commands) or 'none'}"
         )
 
 
 class SlashCommandLoader:
     """Load and expand slash command templates.
 
-    Discovers markdown templates from a commands directory and
-    provides template expansion with argument substitution.
+    Discovers markdown templates from a commands directory, or takes them
+    from an in-memory mapping, and provides template expansion with
+    argument substitution.
     """
 
     def __init__(
         self,
-        commands_dir: Optional[Path] = None,
+        commands_dir: Optional[Union[Path, Mapping[str, str]]] = None,
         default_dir: str = ".claude/commands",
     ) -> None:
         """Initialize the command loader.
 
         Args:
-            commands_dir: Path to commands directory (optional)
+            commands_dir: Path to commands directory, or a mapping of command
+                name to template to serve without touching disk (optional)
             default_dir: Default relative path if commands_dir not specified
         """
+        # command name -> template when templates are given in memory
+        self._memory_templates: Optional[Dict[str, str]] = None
+        if isinstance(commands_dir, Mapping):
+            self._memory_templates = {
+                sys.intern(name): template for name, template in commands_dir.items()
+            }
+            commands_dir = None
+
         if commands_dir is None:
             commands_dir = Path(default_dir)
 
         self.commands_dir = Path(commands_dir)
         self.commands: Dict[str, str] = {}
+        # command name -> template split on ARGUMENTS_PLACEHOLDER, so expansion
+        # is a single str.join instead of a scan-and-replace per call
+        self._segments: Dict[str, Tuple[str, ...]] = {}
+        # command name -> (mtime_ns, size) of the template file last read
+        self._file_stats: Dict[str, Tuple[int, int]] = {}
+        # Command names in sorted order, rebuilt whenever discovery runs
+        self._sorted_commands: Tuple[str, ...] = ()
+        # "Available commands" lines for error messages, rebuilt with the above
+        self._formatted_command_lines: Tuple[str, ...] = ()
         self._discover()
 
     def _discover(self) -> None:
-        """Discover command templates in the commands directory."""
+        """Discover command templates in the commands directory.
+
+        Templates whose file modification time and size are unchanged since
+        the last discovery are not re-read, and commands whose files have
+        disappeared are dropped.
+        """
+        self._apply_scan(self._scan())
+
+    async def _discover_async(self) -> None:
+        """Discover command templates without blocking the event loop.
+
+        Directory scanning and template reads run in a worker thread; the
+        loader's state is then updated on the event loop.
+        """
+        self._apply_scan(await asyncio.to_thread(self._scan))
+
+    def _scan(self) -> Optional[_ScanResult]:
+        """Scan the commands directory and read new or changed templates.
+
+        Only performs file I/O; loader state is left untouched so this can
+        run in a worker thread.
+
+        Returns:
+            Discovered command names and the templates that were (re)read,
+            or None if the commands directory is unusable
+        """
+        if self._memory_templates is not None:
+            # In-memory templates never change; only the first scan loads them
+            return set(self._memory_templates), {
+                name: (template, (0, len(template)))
+                for name, template in self._memory_templates.items()
+                if name not in self.commands
+            }
+
         if not self.commands_dir.exists():
             logger.warning(
                 "Commands directory not found",
                 path=str(self.commands_dir),
             )
-            return
+            return None
 
         if not self.commands_dir.is_dir():
             logger.warning(
                 "Commands path is not a directory",
                 path=str(self.commands_dir),
             )
-            return
+            return None
 
         # Find all .md files in the directory
-        for md_file in self.commands_dir.glob("*.md"):
-            command_name = (
-                md_file.stem
-            )  # e.g., "speckit.specify" from "speckit.specify.md"
-            try:
-                template_content = md_file.read_text(encoding="utf-8")
-                self.commands[command_name] = template_content
-                logger.debug(
-                    "Discovered command",
-                    name=command_name,
-                    file=str(md_file),
-                )
-            except Exception as e:
-                logger.error(
-                    "Failed to load command template",
-                    file=str(md_file),
-                    error=str(e),
-                )
+        discovered: Set[str] = set()
+        loaded: Dict[str, Tuple[str, Tuple[int, int]]] = {}
+        with os.scandir(self.commands_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".md") or not entry.is_file():
+                    continue
+
+                # e.g., "speckit.specify" from "speckit.specify.md"
+                command_name = sys.intern(entry.name[: -len(".md")])
+                try:
+                    stat = entry.stat()
+                    signature = (stat.st_mtime_ns, stat.st_size)
+                    if (
+                        command_name in self.commands
+                        and self._file_stats.get(command_name) == signature
+                    ):
+                        discovered.add(command_name)
+                        continue
+
+                    with open(entry.path, encoding="utf-8") as f:
+                        loaded[command_name] = (f.read(), signature)
+                    discovered.add(command_name)
+                    logger.debug(
+                        "Discovered command",
+                        name=command_name,
+                        file=entry.path,
+                    )
+                except Exception as e:
+                    logger.error(
+                        "Failed to load command template",
+                        file=entry.path,
+                        error=str(e),
+                    )
+
+        return discovered, loaded
+
+    def _apply_scan(self, scan: Optional[_ScanResult]) -> None:
+        """Update the loaded commands from the result of ``_scan``.
+
+        Args:
+            scan: Result of ``_scan``; None clears all commands
+        """
+        if scan is None:
+            self.commands.clear()
+            self._segments.clear()
+            self._file_stats.clear()
+            self._set_sorted_commands(())
+            return
+
+        discovered, loaded = scan
+        for command_name, (template_content, signature) in loaded.items():
+            self.commands[command_name] = template_content
+            self._segments[command_name] = tuple(
+                template_content.split(ARGUMENTS_PLACEHOLDER)
+            )
+            self._file_stats[command_name] = signature
+
+        # Forget commands whose templates were removed or became unreadable
+        for command_name in self.commands.keys() - discovered:
+            del self.commands[command_name]
+            del self._segments[command_name]
+            self._file_stats.pop(command_name, None)
+
+        self._set_sorted_commands(tuple(sorted(self.commands)))
 
         logger.info(
             "Command discovery complete",
@@ -97,6 +209,17 @@ class SlashCommandLoader:
             commands=list(self.commands.keys()),
         )
 
+    def _set_sorted_commands(self, sorted_commands: Tuple[str, ...]) -> None:
+        """Replace the sorted command names and their formatted listing.
+
+        Args:
+            sorted_commands: Command names in sorted order
+        """
+        self._sorted_commands = sorted_commands
+        self._formatted_command_lines = tuple(
+            f"  • `/{command}`" for command in sorted_commands
+        ) or ("  (no commands discovered)",)
+
     def expand(self, command: str, arguments: str) -> str:
         """Expand a command template with arguments.
 
@@ -110,16 +233,20 @@ class SlashCommandLoader:
         Raises:
             UnknownCommandError: If command is not found
         """
-        template = self.commands.get(command)
-
-        if template is None:
+        try:
+            segments = self._segments[command]
+        except KeyError:
             raise UnknownCommandError(
                 command=command,
-                available_commands=self.list_commands(),
-            )
+                available_commands=self._sorted_commands,
+            ) from None
 
-        # Replace all occurrences of $ARGUMENTS
-        expanded = template.replace("$ARGUMENTS", arguments)
+        if len(segments) == 1:
+            # No $ARGUMENTS placeholder: the template is used verbatim
+            expanded = segments[0]
+        else:
+            # Substitute every $ARGUMENTS by joining the pre-split template
+            expanded = arguments.join(segments)
 
         logger.debug(
             "Expanded command",
@@ -130,13 +257,25 @@ class SlashCommandLoader:
 
         return expanded
 
-    def list_commands(self) -> List[str]:
+    def list_commands(self) -> Sequence[str]:
         """List all available command names.
 
+        The returned tuple is shared; discovery replaces it instead of
+        mutating it.
+
+        Returns:
+            Sorted command names (without leading /)
+        """
+        return self._sorted_commands
+
+    @property
+    def formatted_command_lines(self) -> Sequence[str]:
+        """Lines listing the available commands, for user-facing messages.
+
         Returns:
-            List of command names (without leading /)
+            One bullet line per command, or a single placeholder line
         """
-        return list(self.commands.keys())
+        return self._formatted_command_lines
 
     def has_command(self, command: str) -> bool:
         """Check if a command exists.
@@ -163,8 +302,16 @@ class SlashCommandLoader:
     def reload(self) -> None:
         """Reload commands from directory.
 
-        Useful if templates have been modified.
+        Useful if templates have been modified. Only new or changed
+        template files are read again.
         """
-        self.commands.clear()
         self._discover()
         logger.info("Commands reloaded", count=len(self.commands))
+
+    async def reload_async(self) -> None:
+        """Reload commands from directory without blocking the event loop.
+
+        Same as ``reload`` but the file I/O runs in a worker thread.
+        """
+        await self._discover_async()
+        logger.info("Commands reloaded", count=len(self.commands))
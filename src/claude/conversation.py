@@ -40,9 +40,10 @@ class ConversationManager:
         """
         self.agent = agent_integration
         self.session_manager = session_manager
-        self._active_queries: Dict[int, bool] = {}  # user_id -> is_active
-        self._cancel_flags: Dict[int, asyncio.Event] = {}  # user_id -> cancel_event
-        self._lock = asyncio.Lock()
+        # user_id -> cancel event; an entry exists only while a query is active.
+        # Accessed without a lock: every read-modify-write below completes
+        # without an await, so coroutines on the loop cannot interleave.
+        self._cancel_events: Dict[int, asyncio.Event] = {}
 
     async def start_conversation(
         self,
@@ -75,19 +76,21 @@ class ConversationManager:
             project_path=str(project_path),
         )
 
-        # Set up cancellation
+        # Set up cancellation. Each conversation gets its own Event rather
+        # than a pooled per-user one: the identity check in the cleanup below
+        # relies on it, so an overlapping older conversation for the same
+        # user can never remove or clear the newer one's entry.
         cancel_event = asyncio.Event()
-        async with self._lock:
-            self._active_queries[user_id] = True
-            self._cancel_flags[user_id] = cancel_event
+        self._cancel_events[user_id] = cancel_event
 
+        # Query the agent
+        responses = self.agent.query(
+            user_id=user_id,
+            prompt=prompt,
+            stream_callback=stream_callback,
+        )
         try:
-            # Query the agent
-            async for response in self.agent.query(
-                user_id=user_id,
-                prompt=prompt,
-                stream_callback=stream_callback,
-            ):
+            async for response in responses:
                 # Check for cancellation
                 if cancel_event.is_set():
                     logger.info("Conversation cancelled", user_id=user_id)
@@ -100,10 +103,13 @@ class ConversationManager:
                 yield response
 
         finally:
-            # Cleanup
-            async with self._lock:
-                self._active_queries.pop(user_id, None)
-                self._cancel_flags.pop(user_id, None)
+            # Stop the agent stream now rather than when the abandoned
+            # generator is garbage collected
+            await responses.aclose()
+
+            # Cleanup, unless a newer conversation has replaced this one
+            if self._cancel_events.get(user_id) is cancel_event:
+                del self._cancel_events[user_id]
 
     async def stop_conversation(self, user_id: int) -> bool:
         """Stop an active conversation.
@@ -114,20 +120,14 @@ class ConversationManager:
         Returns:
             True if a conversation was stopped, False if no active conversation
         """
-        async with self._lock:
-            # Check if user has active query
-            if not self._active_queries.get(user_id):
-                logger.debug("No active conversation to stop", user_id=user_id)
-                return False
-
-            # Set cancel flag
-            cancel_event = self._cancel_flags.get(user_id)
-            if cancel_event:
-                cancel_event.set()
+        # Remove the active query; absence means nothing to stop
+        cancel_event = self._cancel_events.pop(user_id, None)
+        if cancel_event is None:
+            logger.debug("No active conversation to stop", user_id=user_id)
+            return False
 
-            # Remove from active queries (cleanup)
-            self._active_queries.pop(user_id, None)
-            self._cancel_flags.pop(user_id, None)
+        # Set cancel flag
+        cancel_event.set()
 
         # Close the SDK session
         await self.agent.close_session(user_id)
@@ -144,7 +144,7 @@ class ConversationManager:
         Returns:
             True if user has an active query
         """
-        return self._active_queries.get(user_id, False)
+        return user_id in self._cancel_events
 
     async def get_conversation_info(
         self, user_id: int, project_path: Path
@@ -188,7 +188,8 @@ class ConversationManager:
         Returns:
             Number of active conversations
         """
-        return sum(1 for active in self._active_queries.values() if active)
+        # Entries are removed as soon as a conversation ends or is stopped
+        return len(self._cancel_events)
 
 
 # Module-level singleton
@@ -4,15 +4,27 @@ Provides simple interface for bot handlers.
 Supports both legacy SDK and new Agent SDK integration.
 """
 
+import asyncio
+import functools
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import structlog
 
 from ..config.settings import Settings
 from .agent_integration import AgentIntegration
 from .agent_integration import StreamUpdate as AgentStreamUpdate
-from .commands.executor import CommandExecutor, is_slash_command
+from .commands.executor import CommandExecutor, parse_slash_command
 from .exceptions import ClaudeToolValidationError
 from .integration import ClaudeProcessManager, ClaudeResponse, StreamUpdate
 from .monitor import ToolMonitor
@@ -21,6 +33,121 @@ from .session import SessionManager
 
 logger = structlog.get_logger()
 
+# Tools whose blocking aborts a command immediately instead of at the end
+_CRITICAL_TOOLS = frozenset({"Task", "Read", "Write", "Edit"})
+
+# Tools suggested to administrators alongside the blocked ones
+ADMIN_SUGGESTED_TOOLS = (
+    "Read",
+    "Write",
+    "Edit",
+    "Bash",
+    "Glob",
+    "Grep",
+    "LS",
+    "Task",
+    "MultiEdit",
+    "NotebookRead",
+    "NotebookEdit",
+    "WebFetch",
+    "TodoRead",
+    "TodoWrite",
+    "WebSearch",
+)
+
+
+@functools.lru_cache(maxsize=128)
+def _render_admin_instructions(
+    blocked_tools: Tuple[str, ...], env_file_exists: bool
+) -> str:
+    """Render admin instructions for enabling blocked tools.
+
+    Pure formatting, cached because the same blocked tools recur.
+
+    Args:
+        blocked_tools: Names of the tools that were blocked, in reported order
+        env_file_exists: Whether a ``.env`` file exists in the working directory
+
+    Returns:
+        Markdown instructions, or an empty string if nothing was blocked
+    """
+    if not blocked_tools:
+        return ""
+
+    # Merged list without duplicates, preserving order
+    merged_tools = list(dict.fromkeys((*ADMIN_SUGGESTED_TOOLS, *blocked_tools)))
+    merged_tools_str = ",".join(merged_tools)
+    merged_tools_py = ", ".join(f'"{tool}"' for tool in merged_tools)
+
+    instructions = ["**For Administrators:**", ""]
+
+    if env_file_exists:
+        instructions.append("To enable these tools, add them to your `.env` file:")
+    else:
+        instructions.append("To enable these tools:")
+        instructions.append("1. Create a `.env` file in your project root")
+        instructions.append("2. Add the following line:")
+    instructions.append("```")
+    instructions.append(f'CLAUDE_ALLOWED_TOOLS="{merged_tools_str}"')
+    instructions.append("```")
+
+    instructions.append("")
+    instructions.append("Or modify the default in `src/config/settings.py`:")
+    instructions.append("```python")
+    instructions.append("claude_allowed_tools: Optional[List[str]] = Field(")
+    instructions.append(f"    default=[{merged_tools_py}],")
+    instructions.append('    description="List of allowed Claude tools",')
+    instructions.append(")")
+    instructions.append("```")
+
+    return "\n".join(instructions)
+
+
+@functools.lru_cache(maxsize=128)
+def _render_tool_error_message(
+    blocked_tools: Tuple[str, ...],
+    allowed_tools: Tuple[str, ...],
+    admin_instructions: str,
+) -> str:
+    """Render the user-facing message for blocked tools.
+
+    Args:
+        blocked_tools: Names of the tools that were blocked, in reported order
+        allowed_tools: Currently allowed tools, in configured order
+        admin_instructions: Output of ``_render_admin_instructions``
+
+    Returns:
+        Markdown error message
+    """
+    tool_list = ", ".join(f"`{tool}`" for tool in blocked_tools)
+    allowed_list = (
+        ", ".join(f"`{tool}`" for tool in allowed_tools) if allowed_tools else "None"
+    )
+
+    message = [
+        "🚫 **Tool Access Blocked**",
+        "",
+        f"Claude tried to use tools that are not currently allowed:",
+        f"{tool_list}",
+        "",
+        "**Why this happened:**",
+        "• Claude needs these tools to complete your request",
+        "• These tools are not in the allowed tools list",
+        "• This is a security feature to control what Claude can do",
+        "",
+        "**What you can do:**",
+        "• Contact the administrator to request access to these tools",
+        "• Try rephrasing your request to use different approaches",
+        "• Use simpler requests that don't require these tools",
+        "",
+        "**Currently allowed tools:**",
+        f"{allowed_list}",
+        "",
+        admin_instructions,
+    ]
+
+    return "\n".join(message)
+
 
 class ClaudeIntegration:
     """Main integration point for Claude Code.
@@ -61,14 +188,16 @@ class ClaudeIntegration:
             telegram_context=telegram_context,
         )
 
-        # Initialize legacy managers for fallback capability
-        self.sdk_manager = (
-            sdk_manager or ClaudeSDKManager(config) if config.use_sdk else None
-        )
-        self.process_manager = process_manager or ClaudeProcessManager(config)
+        # Legacy managers for fallback capability; created on first use so
+        # the Agent SDK path never builds them
+        self._sdk_manager = sdk_manager
+        self._process_manager = process_manager
+
+        # SDK availability is fixed at import time, so it is read only once
+        self._use_agent_sdk = bool(self.agent_integration.is_sdk_available)
 
         # Use Agent SDK by default if available, else legacy SDK, else subprocess
-        if self.agent_integration.is_sdk_available:
+        if self._use_agent_sdk:
             self.manager = self.agent_integration
             logger.info(
                 "Using Agent SDK integration",
@@ -84,6 +213,11 @@ class ClaudeIntegration:
         self.session_manager = session_manager
         self.tool_monitor = tool_monitor
         self._sdk_failed_count = 0  # Track SDK failures for adaptive fallback
+        # Allowed tools in configured order, for validation error messages
+        self._allowed_tools = tuple(config.claude_allowed_tools or ())
+        self._allowed_tools_md = ", ".join(f"`{tool}`" for tool in self._allowed_tools)
+        # Checked once; only changes which admin instructions are shown
+        self._env_file_exists = Path(".env").exists()
 
         # Initialize command executor for slash commands
         self.command_executor = (
@@ -92,6 +226,18 @@ class ClaudeIntegration:
             else None
         )
 
+    @functools.cached_property
+    def sdk_manager(self) -> Optional[ClaudeSDKManager]:
+        """Legacy SDK manager, or None when the legacy SDK is disabled."""
+        if not self.config.use_sdk:
+            return None
+        return self._sdk_manager or ClaudeSDKManager(self.config)
+
+    @functools.cached_property
+    def process_manager(self) -> ClaudeProcessManager:
+        """Subprocess manager used as the final fallback."""
+        return self._process_manager or ClaudeProcessManager(self.config)
+
     async def run_command(
         self,
         prompt: str,
@@ -101,15 +247,22 @@ class ClaudeIntegration:
         on_stream: Optional[Callable[[StreamUpdate], None]] = None,
     ) -> ClaudeResponse:
         """Run Claude Code command with full integration."""
-        # Process slash commands if enabled
-        if self.command_executor and is_slash_command(prompt):
-            logger.info(
+        # Every log line for this command carries the user; bind it once
+        log = logger.bind(user_id=user_id)
+
+        # Process slash commands if enabled. The prompt is parsed once here
+        # and the result handed to the executor.
+        executor = self.command_executor
+        parsed = parse_slash_command(prompt) if executor else None
+        if executor and parsed:
+            log.info(
                 "Processing slash command",
-                user_id=user_id,
                 prompt_preview=prompt[:50],
             )
 
-            result = await self.command_executor.process_message(prompt, user_id)
+            result = await executor.process_message(
+                prompt, user_id, parsed=parsed
+            )
 
             if result["error"]:
                 # Return error as ClaudeResponse
@@ -125,15 +278,14 @@ class ClaudeIntegration:
 
             # Use expanded prompt
             prompt = result["expanded_prompt"]
-            logger.info(
+            log.info(
                 "Expanded slash command",
                 command=result["command"],
                 expanded_length=len(prompt),
             )
 
-        logger.info(
+        log.info(
             "Running Claude command",
-            user_id=user_id,
             working_directory=str(working_directory),
             session_id=session_id,
             prompt_length=len(prompt),
@@ -147,16 +299,25 @@ class ClaudeIntegration:
         # Track streaming updates and validate tool calls
         tools_validated = True
         validation_errors = []
-        blocked_tools = set()
+        # Ordered set of blocked tool names, in the order they were attempted
+        blocked_tools: Dict[str, None] = {}
+        validate_tool_call = self.tool_monitor.validate_tool_call
 
         async def stream_handler(update: StreamUpdate):
             nonlocal tools_validated
 
-            # Validate tool calls
+            # Plain text chunk with nobody listening: nothing to do
+            if not update.tool_calls and on_stream is None:
+                return
+
+            # Validate tool calls. Done one at a time on purpose: the monitor
+            # validates in memory without awaiting anything, so gathering would
+            # only add a task per call, and the fail-fast below must stop at
+            # the first blocked critical tool in the order Claude sent them.
             if update.tool_calls:
                 for tool_call in update.tool_calls:
                     tool_name = tool_call["name"]
-                    valid, error = await self.tool_monitor.validate_tool_call(
+                    valid, error = await validate_tool_call(
                         tool_name,
                         tool_call.get("input", {}),
                         working_directory,
@@ -169,31 +330,22 @@ class ClaudeIntegration:
 
                         # Track blocked tools
                         if "Tool not allowed:" in error:
-                            blocked_tools.add(tool_name)
+                            blocked_tools[tool_name] = None
 
-                        logger.error(
+                        log.error(
                             "Tool validation failed",
                             tool_name=tool_name,
                             error=error,
-                            user_id=user_id,
                         )
 
                         # For critical tools, we should fail fast
-                        if tool_name in ["Task", "Read", "Write", "Edit"]:
+                        if tool_name in _CRITICAL_TOOLS:
                             # Create comprehensive error message
-                            admin_instructions = self._get_admin_instructions(
-                                list(blocked_tools)
-                            )
-                            error_msg = self._create_tool_error_message(
-                                list(blocked_tools),
-                                self.config.claude_allowed_tools or [],
-                                admin_instructions,
-                            )
-
+                            blocked = list(blocked_tools)
                             raise ClaudeToolValidationError(
-                                error_msg,
-                                blocked_tools=list(blocked_tools),
-                                allowed_tools=self.config.claude_allowed_tools or [],
+                                self._format_blocked_tools_error(blocked),
+                                blocked_tools=blocked,
+                                allowed_tools=list(self._allowed_tools),
                             )
 
             # Pass to caller's handler
@@ -201,21 +353,16 @@ class ClaudeIntegration:
                 try:
                     await on_stream(update)
                 except Exception as e:
-                    logger.warning("Stream callback failed", error=str(e))
+                    log.warning("Stream callback failed", error=str(e))
 
         # Execute command
         try:
             # Only continue session if it's not a new session
-            should_continue = bool(session_id) and not getattr(
-                session, "is_new_session", False
-            )
+            is_new_session = session.is_new_session
+            should_continue = bool(session_id) and not is_new_session
 
             # For new sessions, don't pass the temporary session_id to Claude Code
-            claude_session_id = (
-                None
-                if getattr(session, "is_new_session", False)
-                else session.session_id
-            )
+            claude_session_id = None if is_new_session else session.session_id
 
             response = await self._execute_with_fallback(
                 prompt=prompt,
@@ -227,7 +374,7 @@ class ClaudeIntegration:
 
             # Check if tool validation failed
             if not tools_validated:
-                logger.error(
+                log.error(
                     "Command completed but tool validation failed",
                     validation_errors=validation_errors,
                 )
@@ -235,14 +382,8 @@ class ClaudeIntegration:
                 response.is_error = True
                 response.error_type = "tool_validation_failed"
 
-                # Extract blocked tool names for user feedback
-                blocked_tools = []
-                for error in validation_errors:
-                    if "Tool not allowed:" in error:
-                        tool_name = error.split("Tool not allowed: ")[1]
-                        blocked_tools.append(tool_name)
-
-                # Create user-friendly error message
+                # Create user-friendly error message, using the blocked tool
+                # names collected by stream_handler
                 if blocked_tools:
                     tool_list = ", ".join(f"`{tool}`" for tool in blocked_tools)
                     response.content = (
@@ -254,7 +395,7 @@ class ClaudeIntegration:
                         f"• Try rephrasing your request to use different approaches\n"
                         f"• Check what tools are currently available with `/status`\n\n"
                         f"**Currently allowed tools:**\n"
-                        f"{', '.join(f'`{t}`' for t in self.config.claude_allowed_tools or [])}"
+                        f"{self._allowed_tools_md}"
                     )
                 else:
                     response.content = (
@@ -267,8 +408,9 @@ class ClaudeIntegration:
             old_session_id = session.session_id
             await self.session_manager.update_session(session.session_id, response)
 
-            # For new sessions, get the updated session_id from the session manager
-            if hasattr(session, "is_new_session") and response.session_id:
+            # Prefer the session_id Claude reported; for new sessions the
+            # session manager has just switched to it
+            if response.session_id:
                 # The session_id has been updated to Claude's session_id
                 final_session_id = response.session_id
             else:
@@ -278,7 +420,7 @@ class ClaudeIntegration:
             # Ensure response has the correct session_id
             response.session_id = final_session_id
 
-            logger.info(
+            log.info(
                 "Claude command completed",
                 session_id=response.session_id,
                 cost=response.cost,
@@ -290,10 +432,9 @@ class ClaudeIntegration:
             return response
 
         except Exception as e:
-            logger.error(
+            log.error(
                 "Claude command failed",
                 error=str(e),
-                user_id=user_id,
                 session_id=session.session_id,
             )
             raise
@@ -308,11 +449,13 @@ class ClaudeIntegration:
     ) -> ClaudeResponse:
         """Execute command with Agent SDK as primary, subprocess as fallback."""
         # Use Agent SDK if available (preferred)
-        if self.agent_integration and self.agent_integration.is_sdk_available:
+        if self._use_agent_sdk:
             try:
                 logger.debug("Attempting Agent SDK execution")
 
-                # Collect response from async generator
+                # Collect response from async generator. The parts list only
+                # holds references; str.join below sizes the result once and
+                # copies each part a single time.
                 content_parts = []
                 tools_used = []
                 final_session_id = session_id or ""
@@ -320,38 +463,50 @@ class ClaudeIntegration:
 
                 # Convert stream callback for agent integration
                 async def agent_stream_handler(update: AgentStreamUpdate):
-                    if stream_callback:
-                        # Convert AgentStreamUpdate to legacy StreamUpdate
-                        legacy_update = StreamUpdate(
-                            content=update.content or "",
-                            tool_calls=[{"name": update.tool_name, "input": update.tool_input}]
-                            if update.tool_name else [],
-                        )
-                        try:
-                            result = stream_callback(legacy_update)
-                            if hasattr(result, "__await__"):
-                                await result
-                        except Exception as e:
-                            logger.warning("Stream callback failed", error=str(e))
+                    # Only passed to the agent when the caller has a callback
+                    if stream_callback is None:
+                        return
+                    # Convert AgentStreamUpdate to legacy StreamUpdate
+                    legacy_update = StreamUpdate(
+                        type="assistant",
+                        content=update.content or "",
+                        tool_calls=(
+                            [{"name": update.tool_name, "input": update.tool_input}]
+                            if update.tool_name
+                            else None
+                        ),
+                    )
+                    try:
+                        result = stream_callback(legacy_update)
+                        if hasattr(result, "__await__"):
+                            await result
+                    except Exception as e:
+                        logger.warning("Stream callback failed", error=str(e))
 
                 # Query agent integration
                 async for response in self.agent_integration.query(
                     user_id=0,  # Will be set by session manager
                     prompt=prompt,
-                    stream_callback=agent_stream_handler,
+                    # Without a caller callback the agent skips building
+                    # stream updates altogether
+                    stream_callback=agent_stream_handler if stream_callback else None,
                 ):
-                    if response.get("type") == "text":
+                    response_type = response.get("type")
+                    if response_type == "text":
                         content_parts.append(response.get("content", ""))
-                    elif response.get("type") == "tool_use":
-                        tools_used.append({
-                            "name": response.get("tool_name"),
-                            "input": response.get("tool_input"),
-                        })
-                    elif response.get("type") == "complete":
+                    elif response_type == "tool_use":
+                        tools_used.append(
+                            {
+                                "name": response.get("tool_name"),
+                                "input": response.get("tool_input"),
+                            }
+                        )
+                    elif response_type == "complete":
                         cost = response.get("cost", 0.0)
-                        if response.get("session_id"):
-                            final_session_id = response.get("session_id")
-                    elif response.get("type") == "error":
+                        response_session_id = response.get("session_id")
+                        if response_session_id:
+                            final_session_id = response_session_id
+                    elif response_type == "error":
                         # Return error response
                         return ClaudeResponse(
                             content=response.get("content", "Unknown error"),
@@ -366,7 +521,7 @@ class ClaudeIntegration:
                 # Build final response
                 self._sdk_failed_count = 0
                 return ClaudeResponse(
-                    content="\n".join(content_parts) if content_parts else "",
+                    content="\n".join(content_parts),
                     session_id=final_session_id,
                     cost=cost,
                     duration_ms=0,
@@ -434,21 +589,23 @@ class ClaudeIntegration:
         # Get user's sessions
         sessions = await self.session_manager._get_user_sessions(user_id)
 
-        # Find most recent session in this directory (exclude temporary sessions)
-        matching_sessions = [
-            s
-            for s in sessions
-            if s.project_path == working_directory
-            and not s.session_id.startswith("temp_")
-        ]
-
-        if not matching_sessions:
+        # Find most recent session in this directory (exclude temporary
+        # sessions) in a single pass. Paths are compared by their string
+        # form, which Path caches, instead of part by part.
+        working_directory_str = str(working_directory)
+        latest_session = None
+        for s in sessions:
+            if str(s.project_path) != working_directory_str or (
+                s.session_id.startswith("temp_")
+            ):
+                continue
+            if latest_session is None or s.last_used > latest_session.last_used:
+                latest_session = s
+
+        if latest_session is None:
             logger.info("No matching sessions found", user_id=user_id)
             return None
 
-        # Get most recent
-        latest_session = max(matching_sessions, key=lambda s: s.last_used)
-
         # Continue session
         return await self.run_command(
             prompt=prompt or "",
@@ -465,6 +622,10 @@ class ClaudeIntegration:
     async def get_user_sessions(self, user_id: int) -> List[Dict[str, Any]]:
         """Get all sessions for a user."""
         sessions = await self.session_manager._get_user_sessions(user_id)
+        timeout_hours = self.config.session_timeout_hours
+        # Built fresh on every call: the dict literal's constant keys are
+        # already interned, and a cached list would report stale "expired"
+        # flags as time passes.
         return [
             {
                 "session_id": s.session_id,
@@ -474,7 +635,7 @@ class ClaudeIntegration:
                 "total_cost": s.total_cost,
                 "message_count": s.message_count,
                 "tools_used": s.tools_used,
-                "expired": s.is_expired(self.config.session_timeout_hours),
+                "expired": s.is_expired(timeout_hours),
             }
             for s in sessions
         ]
@@ -502,114 +663,49 @@ class ClaudeIntegration:
         """Shutdown integration and cleanup resources."""
         logger.info("Shutting down Claude integration")
 
+        # These steps are independent, so they run concurrently
+        steps: List[Awaitable[Any]] = [
+            # Clean up expired sessions
+            self.cleanup_expired_sessions(),
+        ]
+
         # Close Agent SDK sessions
         if self.agent_integration:
-            await self.agent_integration.close_all()
+            steps.append(self.agent_integration.close_all())
 
         # Kill any active processes (legacy managers)
         if hasattr(self.manager, "kill_all_processes"):
-            await self.manager.kill_all_processes()
+            steps.append(self.manager.kill_all_processes())
 
-        # Clean up expired sessions
-        await self.cleanup_expired_sessions()
+        # Let every step finish before reporting the first failure
+        results = await asyncio.gather(*steps, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
 
         logger.info("Claude integration shutdown complete")
 
     def _get_admin_instructions(self, blocked_tools: List[str]) -> str:
         """Generate admin instructions for enabling blocked tools."""
-        instructions = []
-
-        # Check if settings file exists
-        settings_file = Path(".env")
-
-        if blocked_tools:
-            # Get current allowed tools and create merged list without duplicates
-            current_tools = [
-                "Read",
-                "Write",
-                "Edit",
-                "Bash",
-                "Glob",
-                "Grep",
-                "LS",
-                "Task",
-                "MultiEdit",
-                "NotebookRead",
-                "NotebookEdit",
-                "WebFetch",
-                "TodoRead",
-                "TodoWrite",
-                "WebSearch",
-            ]
-            merged_tools = list(
-                dict.fromkeys(current_tools + blocked_tools)
-            )  # Remove duplicates while preserving order
-            merged_tools_str = ",".join(merged_tools)
-            merged_tools_py = ", ".join(f'"{tool}"' for tool in merged_tools)
-
-            instructions.append("**For Administrators:**")
-            instructions.append("")
-
-            if settings_file.exists():
-                instructions.append(
-                    "To enable these tools, add them to your `.env` file:"
-                )
-                instructions.append("```")
-                instructions.append(f'CLAUDE_ALLOWED_TOOLS="{merged_tools_str}"')
-                instructions.append("```")
-            else:
-                instructions.append("To enable these tools:")
-                instructions.append("1. Create a `.env` file in your project root")
-                instructions.append("2. Add the following line:")
-                instructions.append("```")
-                instructions.append(f'CLAUDE_ALLOWED_TOOLS="{merged_tools_str}"')
-                instructions.append("```")
-
-            instructions.append("")
-            instructions.append("Or modify the default in `src/config/settings.py`:")
-            instructions.append("```python")
-            instructions.append("claude_allowed_tools: Optional[List[str]] = Field(")
-            instructions.append(f"    default=[{merged_tools_py}],")
-            instructions.append('    description="List of allowed Claude tools",')
-            instructions.append(")")
-            instructions.append("```")
-
-        return "\n".join(instructions)
+        if not blocked_tools:
+            return ""
+        return _render_admin_instructions(tuple(blocked_tools), self._env_file_exists)
+
+    def _format_blocked_tools_error(self, blocked_tools: List[str]) -> str:
+        """Create the full error message, admin instructions included."""
+        return self._create_tool_error_message(
+            blocked_tools,
+            self._allowed_tools,
+            self._get_admin_instructions(blocked_tools),
+        )
 
     def _create_tool_error_message(
         self,
         blocked_tools: List[str],
-        allowed_tools: List[str],
+        allowed_tools: Sequence[str],
         admin_instructions: str,
     ) -> str:
         """Create a comprehensive error message for tool validation failures."""
-        tool_list = ", ".join(f"`{tool}`" for tool in blocked_tools)
-        allowed_list = (
-            ", ".join(f"`{tool}`" for tool in allowed_tools)
-            if allowed_tools
-            else "None"
+        return _render_tool_error_message(
+            tuple(blocked_tools), tuple(allowed_tools), admin_instructions
         )
-
-        message = [
-            "🚫 **Tool Access Blocked**",
-            "",
-            f"Claude tried to use tools that are not currently allowed:",
-            f"{tool_list}",
-            "",
-            "**Why this happened:**",
-            "• Claude needs these tools to complete your request",
-            "• These tools are not in the allowed tools list",
-            "• This is a security feature to control what Claude can do",
-            "",
-            "**What you can do:**",
-            "• Contact the administrator to request access to these tools",
-            "• Try rephrasing your request to use different approaches",
-            "• Use simpler requests that don't require these tools",
-            "",
-            "**Currently allowed tools:**",
-            f"{allowed_list}",
-            "",
-            admin_instructions,
-        ]
-
-        return "\n".join(message)
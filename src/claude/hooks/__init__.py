@@ -6,12 +6,15 @@ Claude's tool usage for security enforcement.
 
 from .confirmation import (
     ConfirmationState,
+    PendingConfirmation,
     create_confirmation_request,
     format_confirmation_message,
     get_confirmation_state,
     requires_confirmation,
 )
 from .security_hooks import (
+    ACTION_CONFIRM,
+    ACTION_DENY,
     DANGEROUS_PATTERNS,
     bash_security_hook,
     create_audit_record,
@@ -23,6 +26,8 @@ from .security_hooks import (
 
 __all__ = [
     # Security hooks
+    "ACTION_CONFIRM",
+    "ACTION_DENY",
     "DANGEROUS_PATTERNS",
     "bash_security_hook",
     "create_audit_record",
@@ -32,6 +37,7 @@ __all__ = [
     "log_security_event",
     # Confirmation flow
     "ConfirmationState",
+    "PendingConfirmation",
     "create_confirmation_request",
     "format_confirmation_message",
     "get_confirmation_state",
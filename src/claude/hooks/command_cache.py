@@ -0,0 +1,40 @@
+"""Per-command result caching for the hook command checks.
+
+Agents re-issue the same commands (git status, ls, ...) throughout a
+session, so the pure checks on a command string are cached on it.
+"""
+
+import functools
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+# Commands longer than this are checked without caching, so huge payloads
+# are not kept alive by the caches
+MAX_CACHED_COMMAND_LENGTH = 4096
+
+
+def cache_per_command(
+    maxsize: int,
+) -> Callable[[Callable[[str], T]], Callable[[str], T]]:
+    """Cache a pure check of a command string, skipping overlong commands.
+
+    Args:
+        maxsize: Most results to keep, least recently used dropped first
+
+    Returns:
+        Decorator for a function whose only argument is the command
+    """
+
+    def decorate(check: Callable[[str], T]) -> Callable[[str], T]:
+        cached = functools.lru_cache(maxsize=maxsize)(check)
+
+        @functools.wraps(check)
+        def lookup(command: str) -> T:
+            if len(command) > MAX_CACHED_COMMAND_LENGTH:
+                return check(command)
+            return cached(command)
+
+        return lookup
+
+    return decorate
@@ -4,10 +4,15 @@ Provides utilities for requesting user confirmation before
 executing potentially dangerous or irreversible commands.
 """
 
-from typing import Any, Dict, List, Optional
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 import structlog
 
+from .command_cache import cache_per_command
+
 logger = structlog.get_logger(__name__)
 
 # Commands that require user confirmation (but aren't blocked)
@@ -65,6 +70,22 @@ SAFE_PATTERNS: List[str] = [
 ]
 
 
+# Safe patterns lowercased once, as a tuple for a single str.startswith call.
+# Indexing them by first word instead was measured slower: partitioning the
+# command costs more than the C-level prefix loop it would save, and a prefix
+# trie walked character by character in Python would be slower still.
+# Confirmation patterns match anywhere in the command, so they cannot be
+# indexed that way.
+_SAFE_PREFIXES = tuple(pattern.lower() for pattern in SAFE_PATTERNS)
+
+# All confirmation patterns as one case-folded literal alternation, so the
+# command is scanned once in C instead of once per pattern
+_CONFIRMATION_RE = re.compile(
+    "|".join(re.escape(pattern.lower()) for pattern in CONFIRMATION_PATTERNS)
+)
+
+
+@cache_per_command(maxsize=2048)
 def requires_confirmation(command: str) -> bool:
     """Check if a command requires user confirmation.
 
@@ -77,16 +98,11 @@ def requires_confirmation(command: str) -> bool:
     command_lower = command.lower().strip()
 
     # Check safe patterns first
-    for safe in SAFE_PATTERNS:
-        if command_lower.startswith(safe.lower()):
-            return False
+    if command_lower.startswith(_SAFE_PREFIXES):
+        return False
 
     # Check confirmation patterns
-    for pattern in CONFIRMATION_PATTERNS:
-        if pattern.lower() in command_lower:
-            return True
-
-    return False
+    return _CONFIRMATION_RE.search(command_lower) is not None
 
 
 def create_confirmation_request(
@@ -121,6 +137,19 @@ def create_confirmation_request(
     return request
 
 
+# Filled in by format_confirmation_message; values are substituted as-is, so
+# braces in commands need no escaping
+_CONFIRMATION_MESSAGE_TEMPLATE = (
+    "**Confirmation Required**\n"
+    "\n"
+    "Command: `{command}`{ellipsis}\n"
+    "Reason: {reason}"
+    "{preview_block}\n"
+    "\n"
+    "Reply with **yes** to proceed or **no** to cancel."
+)
+
+
 def format_confirmation_message(
     command: str,
     reason: str,
@@ -136,42 +165,49 @@ def format_confirmation_message(
     Returns:
         Formatted confirmation message
     """
-    lines = [
-        "**Confirmation Required**",
-        "",
-        f"Command: `{command[:100]}`" + ("..." if len(command) > 100 else ""),
-        f"Reason: {reason}",
-    ]
-
-    if preview:
-        lines.extend(
-            [
-                "",
-                "Preview:",
-                f"```{preview}```",
-            ]
-        )
-
-    lines.extend(
-        [
-            "",
-            "Reply with **yes** to proceed or **no** to cancel.",
-        ]
+    return _CONFIRMATION_MESSAGE_TEMPLATE.format_map(
+        {
+            "command": command[:100],
+            "ellipsis": "..." if len(command) > 100 else "",
+            "reason": reason,
+            "preview_block": f"\n\nPreview:\n```{preview}```" if preview else "",
+        }
     )
 
-    return "\n".join(lines)
+
+class PendingConfirmation(NamedTuple):
+    """A command awaiting the user's confirmation."""
+
+    command: str
+    reason: str
+    callback_data: Dict[str, Any]
 
 
 class ConfirmationState:
     """Track pending confirmations for users.
 
     Stores pending confirmation requests keyed by user ID,
-    allowing async confirmation flows.
+    allowing async confirmation flows. Confirmations expire after
+    ``ttl_seconds`` and the oldest are evicted beyond ``max_pending``,
+    so abandoned requests do not accumulate in a long-lived process.
     """
 
-    def __init__(self) -> None:
-        """Initialize confirmation state."""
-        self._pending: Dict[int, Dict[str, Any]] = {}
+    def __init__(self, max_pending: int = 10_000, ttl_seconds: float = 900.0) -> None:
+        """Initialize confirmation state.
+
+        Args:
+            max_pending: Maximum number of pending confirmations kept
+            ttl_seconds: Seconds after which a pending confirmation expires
+        """
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        # user_id -> (expiry on the monotonic clock, pending confirmation),
+        # oldest first
+        self._pending: "OrderedDict[int, Tuple[float, PendingConfirmation]]" = (
+            OrderedDict()
+        )
+        # Confirmations dropped by expiry or the size cap, never answered
+        self.pending_evicted = 0
 
     def set_pending(
         self,
@@ -188,11 +224,14 @@ class ConfirmationState:
             reason: Reason for confirmation
             callback_data: Optional data to include when confirmed
         """
-        self._pending[user_id] = {
-            "command": command,
-            "reason": reason,
-            "callback_data": callback_data or {},
-        }
+        self._pending.pop(user_id, None)
+        self._pending[user_id] = (
+            time.monotonic() + self.ttl_seconds,
+            PendingConfirmation(command, reason, callback_data or {}),
+        )
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.pending_evicted += 1
 
         logger.debug(
             "Set pending confirmation",
@@ -200,18 +239,26 @@ class ConfirmationState:
             command=command[:50],
         )
 
-    def get_pending(self, user_id: int) -> Optional[Dict[str, Any]]:
+    def get_pending(self, user_id: int) -> Optional[PendingConfirmation]:
         """Get pending confirmation for a user.
 
         Args:
             user_id: User ID
 
         Returns:
-            Pending confirmation dict or None
+            Pending confirmation or None
         """
-        return self._pending.get(user_id)
-
-    def clear_pending(self, user_id: int) -> Optional[Dict[str, Any]]:
+        item = self._pending.get(user_id)
+        if item is None:
+            return None
+        expires_at, pending = item
+        if expires_at <= time.monotonic():
+            del self._pending[user_id]
+            self.pending_evicted += 1
+            return None
+        return pending
+
+    def clear_pending(self, user_id: int) -> Optional[PendingConfirmation]:
         """Clear and return pending confirmation for a user.
 
         Args:
@@ -220,7 +267,10 @@ class ConfirmationState:
         Returns:
             The cleared pending confirmation or None
         """
-        return self._pending.pop(user_id, None)
+        pending = self.get_pending(user_id)
+        if pending is not None:
+            del self._pending[user_id]
+        return pending
 
     def has_pending(self, user_id: int) -> bool:
         """Check if user has pending confirmation.
@@ -231,7 +281,7 @@ class ConfirmationState:
         Returns:
             True if user has pending confirmation
         """
-        return user_id in self._pending
+        return self.get_pending(user_id) is not None
 
 
 # Global confirmation state instance
@@ -5,75 +5,156 @@ and enforce security policies before tool execution.
 """
 
 import re
+import sys
+import time
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import structlog
 
+from .command_cache import cache_per_command
+
 logger = structlog.get_logger(__name__)
 
+# Pattern actions. Every action string handed out comes from these constants,
+# so the decision ladder's comparisons hit CPython's identity fast path.
+ACTION_DENY = sys.intern("deny")
+ACTION_CONFIRM = sys.intern("confirm")
+
 # Dangerous command patterns that should be blocked or require confirmation
 # Each pattern is a tuple of (regex_pattern, description, action)
 # action: 'deny' = always block, 'confirm' = require user confirmation
 DANGEROUS_PATTERNS: List[tuple[str, str, str]] = [
     # Destructive file operations
-    (r"rm\s+(-[rf]+\s+)*[/~.]", "Recursive/forced file deletion", "deny"),
-    (r"rm\s+-[a-z]*r[a-z]*\s+-[a-z]*f", "Recursive forced deletion", "deny"),
-    (r"rm\s+-[a-z]*f[a-z]*\s+-[a-z]*r", "Forced recursive deletion", "deny"),
+    (r"rm\s+(-[rf]+\s+)*[/~.]", "Recursive/forced file deletion", ACTION_DENY),
+    (r"rm\s+-[a-z]*r[a-z]*\s+-[a-z]*f", "Recursive forced deletion", ACTION_DENY),
+    (r"rm\s+-[a-z]*f[a-z]*\s+-[a-z]*r", "Forced recursive deletion", ACTION_DENY),
     # Device writes (except /dev/null)
-    (r">\s*/dev/(?!null)", "Write to device file", "deny"),
-    (r"dd\s+.*of=/dev/(?!null)", "Direct device write with dd", "deny"),
+    (r">\s*/dev/(?!null)", "Write to device file", ACTION_DENY),
+    (r"dd\s+.*of=/dev/(?!null)", "Direct device write with dd", ACTION_DENY),
     # Dangerous permissions
-    (r"chmod\s+777", "World-writable permissions", "deny"),
-    (r"chmod\s+-R\s+777", "Recursive world-writable permissions", "deny"),
+    (r"chmod\s+777", "World-writable permissions", ACTION_DENY),
+    (r"chmod\s+-R\s+777", "Recursive world-writable permissions", ACTION_DENY),
     # Git destructive operations
-    (r"git\s+push\s+.*--force", "Force push to remote", "deny"),
-    (r"git\s+push\s+.*-f\b", "Force push to remote", "deny"),
-    (r"git\s+reset\s+--hard", "Hard reset (destructive)", "confirm"),
-    (r"git\s+clean\s+-[a-z]*f", "Force clean untracked files", "confirm"),
+    (r"git\s+push\s+.*--force", "Force push to remote", ACTION_DENY),
+    (r"git\s+push\s+.*-f\b", "Force push to remote", ACTION_DENY),
+    (r"git\s+reset\s+--hard", "Hard reset (destructive)", ACTION_CONFIRM),
+    (r"git\s+clean\s+-[a-z]*f", "Force clean untracked files", ACTION_CONFIRM),
     # System modification
-    (r"mkfs\.", "Filesystem creation", "deny"),
-    (r"fdisk\s+", "Disk partitioning", "deny"),
-    (r"format\s+", "Disk formatting", "deny"),
+    (r"mkfs\.", "Filesystem creation", ACTION_DENY),
+    (r"fdisk\s+", "Disk partitioning", ACTION_DENY),
+    (r"format\s+", "Disk formatting", ACTION_DENY),
     # Network exfiltration patterns
-    (r"curl\s+.*\|\s*bash", "Piped curl to bash", "deny"),
-    (r"wget\s+.*\|\s*bash", "Piped wget to bash", "deny"),
-    (r"curl\s+.*\|\s*sh", "Piped curl to shell", "deny"),
-    (r"wget\s+.*\|\s*sh", "Piped wget to shell", "deny"),
+    (r"curl\s+.*\|\s*bash", "Piped curl to bash", ACTION_DENY),
+    (r"wget\s+.*\|\s*bash", "Piped wget to bash", ACTION_DENY),
+    (r"curl\s+.*\|\s*sh", "Piped curl to shell", ACTION_DENY),
+    (r"wget\s+.*\|\s*sh", "Piped wget to shell", ACTION_DENY),
     # Fork bombs and resource exhaustion
-    (r":\(\)\s*\{\s*:\|:&\s*\};\s*:", "Fork bomb", "deny"),
-    (r"while\s+true.*do.*done", "Infinite loop", "confirm"),
+    (r":\(\)\s*\{\s*:\|:&\s*\};\s*:", "Fork bomb", ACTION_DENY),
+    (r"while\s+true.*do.*done", "Infinite loop", ACTION_CONFIRM),
 ]
 
-# Compiled patterns for efficiency
-_COMPILED_PATTERNS: Optional[List[tuple[re.Pattern, str, str]]] = None
+# Literals at least one of which every pattern above needs to match, checked
+# with plain substring tests before any regex runs. Keep in sync when adding
+# patterns.
+_DANGER_KEYWORDS = (
+    "rm",
+    ">",
+    "dd",
+    "chmod",
+    "git",
+    "mkfs",
+    "fdisk",
+    "format",
+    "curl",
+    "wget",
+    ":(",
+    "while",
+)
+
+
+def _may_be_dangerous(command: str) -> bool:
+    """Cheaply rule out commands that cannot match any dangerous pattern.
+
+    Non-ASCII commands always go to the regexes: a few characters lowercase
+    differently with ``str.lower`` than under ``re.IGNORECASE``.
+    """
+    if not command.isascii():
+        return True
+    lowered = command.lower()
+    return any(keyword in lowered for keyword in _DANGER_KEYWORDS)
+
+
+# Compiled patterns for efficiency, indexed by position in DANGEROUS_PATTERNS.
+# Compiled at import so the hot path never checks for initialization.
+_COMPILED: Tuple[re.Pattern, ...] = tuple(
+    re.compile(pattern, re.IGNORECASE) for pattern, _, _ in DANGEROUS_PATTERNS
+)
+# (pattern, description, action) per compiled pattern, prebuilt so a match
+# allocates nothing
+_MATCH_INFO: Tuple[Tuple[str, str, str], ...] = tuple(
+    (pattern, sys.intern(desc), action) for pattern, desc, action in DANGEROUS_PATTERNS
+)
+
+# Every dangerous pattern, and only the 'deny' ones, each as a single
+# alternation. A combined search reports whether any pattern matches in one
+# pass, but not which pattern has priority, since alternation prefers the
+# leftmost match in the command rather than the first pattern in the list.
+# A DFA engine such as Hyperscan cannot take these as-is: the /dev/ patterns
+# rely on the (?!null) lookahead, which it does not support. The scan itself
+# already runs in C inside the re module; what Python-level work remains is
+# a handful of calls per command, too little to justify a compiled extension.
+_ANY_PATTERN = re.compile(
+    "|".join(f"(?:{pattern})" for pattern, _, _ in DANGEROUS_PATTERNS),
+    re.IGNORECASE,
+)
+_DENY_PATTERN = re.compile(
+    "|".join(
+        f"(?:{pattern})"
+        for pattern, _, action in DANGEROUS_PATTERNS
+        if action == ACTION_DENY
+    ),
+    re.IGNORECASE,
+)
+
+
+@cache_per_command(maxsize=1024)
+def is_dangerous_command(command: str) -> bool:
+    """Check if a command matches any dangerous pattern.
 
+    Args:
+        command: The shell command to check
 
-def _get_compiled_patterns() -> List[tuple[re.Pattern, str, str]]:
-    """Get compiled regex patterns (lazy initialization)."""
-    global _COMPILED_PATTERNS
-    if _COMPILED_PATTERNS is None:
-        _COMPILED_PATTERNS = [
-            (re.compile(pattern, re.IGNORECASE), desc, action)
-            for pattern, desc, action in DANGEROUS_PATTERNS
-        ]
-    return _COMPILED_PATTERNS
+    Returns:
+        True if the command matches a dangerous pattern
+    """
+    if not _may_be_dangerous(command):
+        return False
+    return _DENY_PATTERN.search(command) is not None
 
 
-def is_dangerous_command(command: str) -> bool:
-    """Check if a command matches any dangerous pattern.
+@cache_per_command(maxsize=4096)
+def _classify_command(command: str) -> Optional[Tuple[str, str, str]]:
+    """Find the highest-priority dangerous pattern matching a command.
 
     Args:
         command: The shell command to check
 
     Returns:
-        True if the command matches a dangerous pattern
+        Tuple of (pattern, description, action) or None
     """
-    patterns = _get_compiled_patterns()
-    for pattern, _, action in patterns:
-        if action == "deny" and pattern.search(command):
-            return True
-    return False
+    # Most commands match nothing: reject them by keyword, then with a
+    # single combined search
+    if not _may_be_dangerous(command):
+        return None
+    if _ANY_PATTERN.search(command) is None:
+        return None
+
+    # Report the first matching pattern in list order, as it takes priority
+    for i, pattern in enumerate(_COMPILED):
+        if pattern.search(command):
+            return _MATCH_INFO[i]
+    return None
 
 
 def get_dangerous_pattern_match(command: str) -> Optional[Dict[str, str]]:
@@ -85,15 +166,25 @@ def get_dangerous_pattern_match(command: str) -> Optional[Dict[str, str]]:
     Returns:
         Dict with 'pattern', 'description', 'action' or None
     """
-    patterns = _get_compiled_patterns()
-    for pattern, description, action in patterns:
-        if pattern.search(command):
-            return {
-                "pattern": pattern.pattern,
-                "description": description,
-                "action": action,
-            }
-    return None
+    match = _classify_command(command)
+    if match is None:
+        return None
+
+    # A fresh dict per call, as callers may modify it
+    pattern, description, action = match
+    return {
+        "pattern": pattern,
+        "description": description,
+        "action": action,
+    }
+
+
+# Tool whose calls the security hook screens
+_BASH_TOOL = "Bash"
+
+# Hook result that leaves the decision to the SDK. Shared by every call: the
+# SDK copies hook results before using them, and callers must not modify it.
+_NO_DECISION: Dict[str, Any] = {}
 
 
 async def bash_security_hook(
@@ -114,24 +205,23 @@ async def bash_security_hook(
     Returns:
         Hook result dict with permission decision
     """
-    # Only process Bash tool
-    tool_name = input_data.get("tool_name", "")
-    if tool_name != "Bash":
-        return {}
+    # Only process Bash tool; every other tool event falls straight through
+    if input_data.get("tool_name") != _BASH_TOOL:
+        return _NO_DECISION
 
     # Extract command from tool input
     tool_input = input_data.get("tool_input", {})
     command = tool_input.get("command", "")
 
     if not command:
-        return {}
+        return _NO_DECISION
 
     # Check for dangerous patterns
     match = get_dangerous_pattern_match(command)
 
     if match is None:
         # Command is safe, allow execution
-        return {}
+        return _NO_DECISION
 
     # Log the blocked/flagged command
     logger.warning(
@@ -142,7 +232,7 @@ async def bash_security_hook(
         tool_use_id=tool_use_id,
     )
 
-    if match["action"] == "deny":
+    if match["action"] == ACTION_DENY:
         # Block the command
         return {
             "hookSpecificOutput": {
@@ -154,7 +244,7 @@ async def bash_security_hook(
             }
         }
 
-    elif match["action"] == "confirm":
+    elif match["action"] == ACTION_CONFIRM:
         # Request user confirmation
         return {
             "hookSpecificOutput": {
@@ -166,25 +256,32 @@ async def bash_security_hook(
             }
         }
 
-    return {}
+    return _NO_DECISION
+
+
+# Hooks configuration handed out by create_security_hooks, built once. Kept
+# as plain dicts and lists, the types ClaudeAgentOptions.hooks expects.
+_SECURITY_HOOKS: Dict[str, List[Dict[str, Any]]] = {
+    "PreToolUse": [
+        {
+            "matcher": {"tool_name": _BASH_TOOL},
+            "callback": bash_security_hook,
+        }
+    ]
+}
 
 
 def create_security_hooks() -> Dict[str, List[Dict[str, Any]]]:
     """Create security hooks configuration for Claude Agent SDK.
 
-    Returns a hooks dict compatible with ClaudeAgentOptions.hooks.
+    Returns a hooks dict compatible with ClaudeAgentOptions.hooks. The
+    same configuration object is returned on every call and must not be
+    modified.
 
     Returns:
         Dict with PreToolUse hooks list
     """
-    return {
-        "PreToolUse": [
-            {
-                "matcher": {"tool_name": "Bash"},
-                "callback": bash_security_hook,
-            }
-        ]
-    }
+    return _SECURITY_HOOKS
 
 
 def create_audit_record(
@@ -202,10 +299,13 @@ def create_audit_record(
         user_id: Optional user ID for attribution
 
     Returns:
-        Audit record dict
+        Audit record dict, timestamped in integer nanoseconds since the
+        epoch; use ``iso_from_ns`` to render it
     """
+    # time.time_ns() is a single clock read with no allocation beyond the
+    # int, so there is nothing for a per-millisecond cached timestamp to save
     return {
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp_ns": time.time_ns(),
         "command": command,
         "decision": decision,
         "reason": reason,
@@ -213,6 +313,18 @@ def create_audit_record(
     }
 
 
+def iso_from_ns(timestamp_ns: int) -> str:
+    """Render an audit record's ``timestamp_ns`` as an ISO-8601 UTC string.
+
+    Args:
+        timestamp_ns: Nanoseconds since the epoch
+
+    Returns:
+        ISO-8601 timestamp
+    """
+    return datetime.fromtimestamp(timestamp_ns / 1e9, tz=timezone.utc).isoformat()
+
+
 def log_security_event(
     event_type: str,
     command: str,
@@ -229,10 +341,14 @@ def log_security_event(
         reason: Reason for the decision
         user_id: Optional user ID
     """
-    record = create_audit_record(command, decision, reason, user_id)
-
+    # Same fields as create_audit_record, passed straight to the logger
+    # rather than through an intermediate record dict
     logger.info(
         "Security event",
         event_type=event_type,
-        **record,
+        timestamp_ns=time.time_ns(),
+        command=command,
+        decision=decision,
+        reason=reason,
+        user_id=user_id,
     )
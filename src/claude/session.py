@@ -239,11 +239,7 @@ class SessionManager:
             old_session_id = session.session_id
 
             # For new sessions, update to Claude's actual session ID
-            if (
-                hasattr(session, "is_new_session")
-                and session.is_new_session
-                and response.session_id
-            ):
+            if session.is_new_session and response.session_id:
                 # Remove old temporary session
                 del self.active_sessions[old_session_id]
                 await self.storage.delete_session(old_session_id)
@@ -260,7 +256,7 @@ class SessionManager:
                     old_session_id=old_session_id,
                     new_session_id=response.session_id,
                 )
-            elif hasattr(session, "is_new_session") and session.is_new_session:
+            elif session.is_new_session:
                 # Mark as no longer new even if no session_id from Claude
                 session.is_new_session = False
 
@@ -16,6 +16,7 @@ from .telegram_tools import (
     get_telegram_context,
     get_telegram_tools,
     set_telegram_context,
+    telegram_context_scope,
     telegram_file,
     telegram_keyboard,
     telegram_message,
@@ -39,4 +40,5 @@ __all__ = [
     "set_telegram_context",
     "get_telegram_context",
     "clear_telegram_context",
+    "telegram_context_scope",
 ]
@@ -55,6 +55,7 @@ async def safe_tool_execution(
     handler: ToolHandler,
     args: Dict[str, Any],
     timeout_seconds: int = 30,
+    is_async: Optional[bool] = None,
 ) -> Dict[str, Any]:
     """Execute a tool handler with error handling and timeout.
 
@@ -62,12 +63,17 @@ async def safe_tool_execution(
         handler: Tool handler function
         args: Arguments to pass to handler
         timeout_seconds: Timeout in seconds
+        is_async: Whether handler is a coroutine function, if already known;
+            detected from the handler otherwise
 
     Returns:
         Tool result or error response
     """
+    if is_async is None:
+        is_async = asyncio.iscoroutinefunction(handler)
+
     try:
-        if asyncio.iscoroutinefunction(handler):
+        if is_async:
             result = await asyncio.wait_for(
                 handler(args),
                 timeout=timeout_seconds,
@@ -140,6 +146,9 @@ class ToolRegistry:
             input_schema: JSON schema for input parameters
             handler: Async function to handle tool calls
         """
+        # A handler's coroutine-ness cannot change, so classify it once here
+        # rather than on every call
+        is_async = asyncio.iscoroutinefunction(handler)
 
         # Wrap handler with safe execution
         async def safe_handler(args: Dict[str, Any]) -> Dict[str, Any]:
@@ -147,6 +156,7 @@ class ToolRegistry:
                 handler,
                 args,
                 timeout_seconds=self.timeout_seconds,
+                is_async=is_async,
             )
 
         self.tools[name] = {
@@ -155,6 +165,7 @@ class ToolRegistry:
             "input_schema": input_schema,
             "handler": safe_handler,
             "original_handler": handler,
+            "is_async": is_async,
         }
 
         logger.info("Registered tool", name=name, description=description)
@@ -4,19 +4,45 @@ These tools enable Claude to send rich Telegram responses including
 inline keyboards, file attachments, progress updates, and formatted messages.
 """
 
+import contextlib
 import contextvars
 import hashlib
 import io
+import tempfile
 import time
-from typing import Any, Dict, List, Optional, Union
+from dataclasses import dataclass, field
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import structlog
 
 from .registry import register_tool
 
+if TYPE_CHECKING:
+    from telegram import InputFile
+
 logger = structlog.get_logger(__name__)
 
+# Imported once here rather than on every tool call
+TELEGRAM_AVAILABLE = False
+try:
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    TELEGRAM_AVAILABLE = True
+except ImportError:
+    logger.debug("python-telegram-bot not available, keyboards will not be sent")
 
+
+@dataclass(slots=True)
 class TelegramToolContext:
     """Context for Telegram tool execution.
 
@@ -24,22 +50,13 @@ class TelegramToolContext:
     files, keyboards, and editing messages.
     """
 
-    def __init__(
-        self,
-        chat_id: int,
-        message_id: Optional[int] = None,
-        bot: Optional[Any] = None,
-    ) -> None:
-        """Initialize Telegram context.
-
-        Args:
-            chat_id: Telegram chat ID
-            message_id: Optional message ID for editing
-            bot: Telegram bot instance
-        """
-        self.chat_id = chat_id
-        self.message_id = message_id
-        self.bot = bot
+    chat_id: int  # Telegram chat ID
+    message_id: Optional[int] = None  # Message to edit, if any
+    bot: Optional[Any] = None  # Telegram bot instance
+    # (text, parse_mode) of the last successful edit_message
+    _last_edit: Optional[Tuple[str, Optional[str]]] = field(
+        default=None, init=False, repr=False
+    )
 
     async def send_message(
         self,
@@ -74,7 +91,7 @@ class TelegramToolContext:
 
     async def send_document(
         self,
-        document: Union[bytes, io.BytesIO],
+        document: Union[bytes, IO[bytes], "InputFile"],
         filename: str,
         caption: Optional[str] = None,
     ) -> Optional[Any]:
@@ -119,19 +136,28 @@ class TelegramToolContext:
             parse_mode: Parse mode
 
         Returns:
-            Edited message or None
+            Edited message, or None if the edit failed or would not change
+            the message
         """
         if self.bot is None or self.message_id is None:
             logger.warning("No bot or message_id available")
             return None
 
+        # Telegram rejects edits that leave the message unchanged with a
+        # "message is not modified" error; skip the round trip instead
+        edit = (text, parse_mode)
+        if edit == self._last_edit:
+            return None
+
         try:
-            return await self.bot.edit_message_text(
+            result = await self.bot.edit_message_text(
                 chat_id=self.chat_id,
                 message_id=self.message_id,
                 text=text,
                 parse_mode=parse_mode,
             )
+            self._last_edit = edit
+            return result
         except Exception as e:
             logger.error("Failed to edit message", error=str(e))
             return None
@@ -143,13 +169,36 @@ _current_context: contextvars.ContextVar[Optional[TelegramToolContext]] = (
 )
 
 
-def set_telegram_context(context: TelegramToolContext) -> None:
+def set_telegram_context(
+    context: TelegramToolContext,
+) -> "contextvars.Token[Optional[TelegramToolContext]]":
     """Set the current Telegram context for tool execution.
 
     Args:
         context: TelegramToolContext instance
+
+    Returns:
+        Token for the change; ``telegram_context_scope`` uses it to restore
+        the previous context and is preferred over calling this directly
     """
-    _current_context.set(context)
+    return _current_context.set(context)
+
+
+@contextlib.contextmanager
+def telegram_context_scope(context: TelegramToolContext) -> Iterator[None]:
+    """Use a Telegram context for the duration of a ``with`` block.
+
+    The previous context is restored on exit, so nested scopes do not leave
+    the outer request pointing at the inner context.
+
+    Args:
+        context: TelegramToolContext instance
+    """
+    token = _current_context.set(context)
+    try:
+        yield
+    finally:
+        _current_context.reset(token)
 
 
 def get_telegram_context() -> Optional[TelegramToolContext]:
@@ -169,12 +218,70 @@ def clear_telegram_context() -> None:
     _current_context.set(None)
 
 
+# Bytes of button text kept in callback_data, leaving room for the "#" and
+# 8-character hash within Telegram's 64-byte limit
+_CALLBACK_TEXT_BYTES = 55
+
+
+def _truncate_utf8(text: str, max_bytes: int) -> str:
+    """Truncate text to at most max_bytes of UTF-8 without splitting characters.
+
+    Args:
+        text: Text to truncate
+        max_bytes: Maximum encoded length in bytes
+
+    Returns:
+        The longest prefix of text that fits
+    """
+    # ASCII is one byte per character, so no encoding round trip is needed
+    if text.isascii():
+        return text[:max_bytes]
+    encoded = text.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode("utf-8", "ignore")
+
+
+# Files with more characters than this are encoded in chunks into a spooled
+# temporary file instead of a single in-memory bytes copy
+_SPOOL_THRESHOLD_CHARS = 1_000_000
+_SPOOL_MAX_MEMORY = 1_048_576
+_ENCODE_CHUNK_CHARS = 65_536
+
+
+def _callback_data(row_idx: int, btn_idx: int, btn_text: str) -> str:
+    """Build unique callback_data for a keyboard button.
+
+    A hash suffix handles:
+    1. Long button text (64-byte Telegram limit)
+    2. Similar/duplicate button labels
+
+    Args:
+        row_idx: Row of the button
+        btn_idx: Position of the button in its row
+        btn_text: Button label
+
+    Returns:
+        Up to 55 bytes of the label, "#", and an 8-character hash
+    """
+    text_hash = hashlib.md5(f"{row_idx}:{btn_idx}:{btn_text}".encode()).hexdigest()[:8]
+    # Truncate text part to leave room for hash
+    return f"{_truncate_utf8(btn_text, _CALLBACK_TEXT_BYTES)}#{text_hash}"
+
+
 # Rate limiting for progress updates (minimum interval between edits)
 _last_progress_update: contextvars.ContextVar[float] = contextvars.ContextVar(
     "last_progress_update", default=0.0
 )
 PROGRESS_UPDATE_INTERVAL = 1.0  # Minimum seconds between progress updates
 
+# Every progress bar, indexed by the number of filled cells
+_PROGRESS_BAR_LENGTH = 10
+_PROGRESS_BARS = tuple(
+    "█" * filled + "░" * (_PROGRESS_BAR_LENGTH - filled)
+    for filled in range(_PROGRESS_BAR_LENGTH + 1)
+)
+
 
 @register_tool(
     name="telegram_keyboard",
@@ -227,34 +334,34 @@ async def telegram_keyboard(
             "isError": True,
         }
 
+    if not TELEGRAM_AVAILABLE:
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": "Keyboard prepared (telegram library not available)",
+                }
+            ],
+        }
+
     # Build keyboard markup
     try:
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-
-        keyboard = []
-        for row_idx, row in enumerate(buttons):
-            keyboard_row = []
-            for btn_idx, btn_text in enumerate(row):
-                # Create unique callback_data using hash to handle:
-                # 1. Long button text (64-byte Telegram limit)
-                # 2. Similar/duplicate button labels
-                # Format: first 48 chars of text + 8-char hash suffix
-                text_hash = hashlib.md5(
-                    f"{row_idx}:{btn_idx}:{btn_text}".encode()
-                ).hexdigest()[:8]
-                # Truncate text part to leave room for hash
-                text_part = btn_text.encode("utf-8")[:55].decode("utf-8", "ignore")
-                cb_data = f"{text_part}#{text_hash}"
-                keyboard_row.append(
-                    InlineKeyboardButton(btn_text, callback_data=cb_data)
+        keyboard = [
+            [
+                InlineKeyboardButton(
+                    btn_text, callback_data=_callback_data(row_idx, btn_idx, btn_text)
                 )
-            keyboard.append(keyboard_row)
+                for btn_idx, btn_text in enumerate(row)
+            ]
+            for row_idx, row in enumerate(buttons)
+        ]
+        button_count = sum(map(len, buttons))
 
         reply_markup = InlineKeyboardMarkup(keyboard)
 
         if ctx:
             await ctx.send_message(message, reply_markup=reply_markup)
-            logger.info("Sent keyboard", button_count=sum(len(r) for r in buttons))
+            logger.info("Sent keyboard", button_count=button_count)
         else:
             logger.warning("No context available, keyboard not sent")
 
@@ -262,20 +369,11 @@ async def telegram_keyboard(
             "content": [
                 {
                     "type": "text",
-                    "text": f"Keyboard sent with {sum(len(r) for r in buttons)} buttons",
+                    "text": f"Keyboard sent with {button_count} buttons",
                 }
             ],
         }
 
-    except ImportError:
-        return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": "Keyboard prepared (telegram library not available)",
-                }
-            ],
-        }
     except Exception as e:
         logger.error("Failed to send keyboard", error=str(e))
         return {
@@ -332,25 +430,51 @@ async def telegram_file(
 
     try:
         # Create file buffer
-        file_bytes = content.encode("utf-8")
-        file_buffer = io.BytesIO(file_bytes)
-        file_buffer.name = filename
-
-        if ctx:
-            await ctx.send_document(
-                document=file_buffer,
-                filename=filename,
-                caption=caption,
-            )
-            logger.info("Sent file", filename=filename, size=len(file_bytes))
+        file_buffer: IO[bytes]
+        document: Union[IO[bytes], "InputFile"]
+        if len(content) > _SPOOL_THRESHOLD_CHARS:
+            # Encode in chunks into a file that spills to disk, so the full
+            # encoded copy is never held in memory next to the string
+            file_buffer = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_MEMORY)
+            for start in range(0, len(content), _ENCODE_CHUNK_CHARS):
+                file_buffer.write(
+                    content[start : start + _ENCODE_CHUNK_CHARS].encode("utf-8")
+                )
+            size = file_buffer.tell()
+            file_buffer.seek(0)
+            # Hand the open handle to the HTTP client so the upload is
+            # streamed from it instead of read back into one bytes object
+            if TELEGRAM_AVAILABLE:
+                from telegram import InputFile
+
+                document = InputFile(
+                    file_buffer, filename=filename, read_file_handle=False
+                )
+            else:
+                document = file_buffer
         else:
-            logger.warning("No context available, file not sent")
+            file_bytes = content.encode("utf-8")
+            file_buffer = io.BytesIO(file_bytes)
+            file_buffer.name = filename
+            size = len(file_bytes)
+            document = file_buffer
+
+        with file_buffer:
+            if ctx:
+                await ctx.send_document(
+                    document=document,
+                    filename=filename,
+                    caption=caption,
+                )
+                logger.info("Sent file", filename=filename, size=size)
+            else:
+                logger.warning("No context available, file not sent")
 
         return {
             "content": [
                 {
                     "type": "text",
-                    "text": f"File '{filename}' sent ({len(file_bytes)} bytes)",
+                    "text": f"File '{filename}' sent ({size} bytes)",
                 }
             ],
         }
@@ -401,7 +525,7 @@ async def telegram_progress(
     percent = args.get("percent", 0)
 
     # Clamp percent to 0-100
-    percent = max(0, min(100, percent))
+    percent = 0 if percent < 0 else 100 if percent > 100 else percent
 
     # Rate limiting: skip update if too recent (prevent Telegram 429 errors)
     current_time = time.time()
@@ -421,10 +545,8 @@ async def telegram_progress(
             ],
         }
 
-    # Create progress bar
-    bar_length = 10
-    filled = int(bar_length * percent / 100)
-    bar = "█" * filled + "░" * (bar_length - filled)
+    # Look up the progress bar for this many filled cells
+    bar = _PROGRESS_BARS[int(_PROGRESS_BAR_LENGTH * percent / 100)]
 
     progress_text = f"{message}\n\n[{bar}] {percent}%"
 
@@ -529,15 +651,19 @@ async def telegram_message(
         }
 
 
-def get_telegram_tools() -> List[str]:
+# Names of the tools registered by this module
+_TELEGRAM_TOOLS: Tuple[str, ...] = (
+    "telegram_keyboard",
+    "telegram_file",
+    "telegram_progress",
+    "telegram_message",
+)
+
+
+def get_telegram_tools() -> Sequence[str]:
     """Get list of Telegram tool names.
 
     Returns:
-        List of tool names
+        Tool names, as a shared immutable tuple
     """
-    return [
-        "telegram_keyboard",
-        "telegram_file",
-        "telegram_progress",
-        "telegram_message",
-    ]
+    return _TELEGRAM_TOOLS
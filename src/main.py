@@ -2,7 +2,10 @@
 
 import argparse
 import asyncio
+import atexit
 import logging
+import logging.handlers
+import queue
 import signal
 import sys
 from pathlib import Path
@@ -15,11 +18,9 @@ from src.bot.core import ClaudeCodeBot
 from src.claude import (
     AgentIntegration,
     ClaudeIntegration,
-    ClaudeProcessManager,
     SessionManager,
     ToolMonitor,
 )
-from src.claude.sdk_integration import ClaudeSDKManager
 from src.config.features import FeatureFlags
 from src.config.loader import load_config
 from src.config.settings import Settings
@@ -41,17 +42,26 @@ def setup_logging(debug: bool = False) -> None:
     """Configure structured logging."""
     level = logging.DEBUG if debug else logging.INFO
 
-    # Configure standard logging
+    # Configure standard logging. Records are handed to a background listener
+    # thread through a queue so that writing to stdout never blocks the event
+    # loop while a Claude response is being streamed.
+    log_queue: queue.Queue = queue.Queue(-1)
     logging.basicConfig(
         level=level,
         format="%(message)s",
-        stream=sys.stdout,
+        handlers=[logging.handlers.QueueHandler(log_queue)],
     )
+    listener = logging.handlers.QueueListener(
+        log_queue, logging.StreamHandler(sys.stdout), respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
 
-    # Configure structlog
+    # Configure structlog. The filtering wrapper compiles the level check into
+    # the bound logger, so calls below ``level`` return before any processor
+    # runs instead of being dropped by the stdlib logger afterwards.
     structlog.configure(
         processors=[
-            structlog.stdlib.filter_by_level,
             structlog.stdlib.add_logger_name,
             structlog.stdlib.add_log_level,
             structlog.stdlib.PositionalArgumentsFormatter(),
@@ -67,7 +77,7 @@ def setup_logging(debug: bool = False) -> None:
         ],
         context_class=dict,
         logger_factory=structlog.stdlib.LoggerFactory(),
-        wrapper_class=structlog.stdlib.BoundLogger,
+        wrapper_class=structlog.make_filtering_bound_logger(level),
         cache_logger_on_first_use=True,
     )
 
@@ -137,16 +147,6 @@ async def create_application(config: Settings) -> Dict[str, Any]:
     agent_integration = AgentIntegration(config=config, telegram_context=None)
     await agent_integration.initialize()
 
-    # Create legacy managers for fallback capability
-    if config.use_sdk:
-        logger.info("Using Claude SDK integration")
-        sdk_manager = ClaudeSDKManager(config)
-        process_manager = ClaudeProcessManager(config)
-    else:
-        logger.info("Using Claude CLI subprocess integration")
-        process_manager = ClaudeProcessManager(config)
-        sdk_manager = None
-
     # Log which SDK is being used
     logger.info(
         "SDK integration initialized",
@@ -154,11 +154,10 @@ async def create_application(config: Settings) -> Dict[str, Any]:
         sdk_available=agent_integration.is_sdk_available,
     )
 
-    # Create main Claude integration facade
+    # Create main Claude integration facade. It creates the legacy SDK and
+    # subprocess managers itself, only if they are needed as a fallback.
     claude_integration = ClaudeIntegration(
         config=config,
-        process_manager=process_manager,
-        sdk_manager=sdk_manager,
         agent_integration=agent_integration,
         session_manager=session_manager,
         tool_monitor=tool_monitor,
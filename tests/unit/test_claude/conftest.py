@@ -0,0 +1,62 @@
+"""Shared fixtures for Claude integration tests."""
+
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import pytest
+
+from src.claude.session import ClaudeSession, InMemorySessionStorage
+
+
+@pytest.fixture(scope="module")
+def sample_session() -> ClaudeSession:
+    """Session for tests that store and read it back without modifying it."""
+    now = datetime.utcnow()
+    return ClaudeSession(
+        session_id="test-123",
+        user_id=12345,
+        project_path=Path("/test"),
+        created_at=now,
+        last_used=now,
+    )
+
+
+@pytest.fixture
+def fresh_storage() -> InMemorySessionStorage:
+    """Empty in-memory session storage."""
+    return InMemorySessionStorage()
+
+
+# Settings the session, agent and conversation tests read: the API key in
+# AgentIntegration.__init__, and the session limits in SessionManager. The
+# query options fields are left out, as those tests run no query.
+SETTINGS_DEFAULTS = {
+    "anthropic_api_key_str": None,
+    "session_timeout_hours": 24,
+    "max_sessions_per_user": 5,
+}
+
+
+@pytest.fixture(scope="session")
+def mock_settings_factory() -> Callable[..., SimpleNamespace]:
+    """Return a factory for fake Settings with the test defaults.
+
+    The fakes are plain namespaces rather than MagicMock(spec=Settings): the
+    code under test only reads these attributes, and no test asserts calls
+    on the config.
+    """
+
+    def make(**overrides: Any) -> SimpleNamespace:
+        return SimpleNamespace(**{**SETTINGS_DEFAULTS, **overrides})
+
+    return make
+
+
+@pytest.fixture(scope="module")
+def conversation_config(
+    mock_settings_factory: Callable[..., SimpleNamespace],
+) -> SimpleNamespace:
+    """Fake Settings with the defaults, for tests that do not modify it."""
+    return mock_settings_factory()
@@ -1,34 +1,61 @@
 """Test Claude Agent SDK integration."""
 
+import asyncio
 from pathlib import Path
 from typing import Any, Dict
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+import structlog
 
-from src.claude.agent_integration import AgentIntegration
+from src.claude import agent_integration as agent_integration_module
+from src.claude.agent_integration import AgentIntegration, StreamUpdate
 from src.config.settings import Settings
 
 
+@pytest.fixture(scope="module")
+def config(tmp_path_factory: pytest.TempPathFactory) -> Settings:
+    """Create test config, validated once and shared by the module."""
+    return Settings(
+        telegram_bot_token="test:token",
+        telegram_bot_username="testbot",
+        approved_directory=tmp_path_factory.mktemp("approved"),
+        use_sdk=True,
+        claude_timeout_seconds=2,
+        permission_mode="acceptEdits",
+        enable_telegram_tools=True,
+        enable_security_hooks=True,
+        enable_slash_commands=True,
+        tool_timeout_seconds=5,
+    )
+
+
+@pytest.fixture(scope="module")
+def minimal_config(tmp_path_factory: pytest.TempPathFactory) -> Settings:
+    """Create config with only the required fields, shared by the module."""
+    return Settings(
+        telegram_bot_token="test:token",
+        telegram_bot_username="testbot",
+        approved_directory=tmp_path_factory.mktemp("minimal"),
+    )
+
+
+@pytest.fixture
+def agent_integration(minimal_config: Settings) -> AgentIntegration:
+    """Create agent integration instance with the minimal config."""
+    return AgentIntegration(config=minimal_config, telegram_context=None)
+
+
+class _FakeClient:
+    """Minimal stand-in for a ClaudeSDKClient held in the clients map."""
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        pass
+
+
 class TestAgentIntegration:
     """Test Agent SDK integration."""
 
-    @pytest.fixture
-    def config(self, tmp_path: Path) -> Settings:
-        """Create test config."""
-        return Settings(
-            telegram_bot_token="test:token",
-            telegram_bot_username="testbot",
-            approved_directory=tmp_path,
-            use_sdk=True,
-            claude_timeout_seconds=2,
-            permission_mode="acceptEdits",
-            enable_telegram_tools=True,
-            enable_security_hooks=True,
-            enable_slash_commands=True,
-            tool_timeout_seconds=5,
-        )
-
     @pytest.fixture
     def agent_integration(self, config: Settings) -> AgentIntegration:
         """Create agent integration instance."""
@@ -87,8 +114,8 @@ class TestAgentIntegration:
     ) -> None:
         """Test close_session removes user's client."""
         user_id = 12345
-        # Manually add a mock client
-        agent_integration.clients[user_id] = MagicMock()
+        # Manually add a fake client
+        agent_integration.clients[user_id] = _FakeClient()
 
         await agent_integration.close_session(user_id)
 
@@ -107,10 +134,10 @@ class TestAgentIntegration:
         self, agent_integration: AgentIntegration
     ) -> None:
         """Test close_all closes all active sessions."""
-        # Add multiple mock clients
-        agent_integration.clients[111] = MagicMock()
-        agent_integration.clients[222] = MagicMock()
-        agent_integration.clients[333] = MagicMock()
+        # Add multiple fake clients
+        agent_integration.clients[111] = _FakeClient()
+        agent_integration.clients[222] = _FakeClient()
+        agent_integration.clients[333] = _FakeClient()
 
         await agent_integration.close_all()
 
@@ -165,3 +192,476 @@ class TestAgentIntegrationConfig:
         servers = integration._create_mcp_servers()
         # Should return empty dict when tools disabled
         assert servers == {}
+
+
+@pytest.mark.skipif(
+    agent_integration_module.SDK_TYPE != "agent",
+    reason="claude-agent-sdk not installed",
+)
+class TestMessageConversion:
+    """Test conversion of Agent SDK messages to response dicts."""
+
+    def test_assistant_text_blocks_joined(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test text blocks are joined into one text message."""
+        from claude_agent_sdk import AssistantMessage, TextBlock
+
+        msg = AssistantMessage(
+            content=[TextBlock(text="Hello"), TextBlock(text="world")],
+            model="claude",
+        )
+
+        assert agent_integration._convert_message_to_dict(msg) == {
+            "type": "text",
+            "content": "Hello\nworld",
+        }
+
+    def test_assistant_tool_use_block(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test a tool-only assistant message is reported as tool_use."""
+        from claude_agent_sdk import AssistantMessage, ToolUseBlock
+
+        msg = AssistantMessage(
+            content=[ToolUseBlock(id="t1", name="Read", input={"path": "a.py"})],
+            model="claude",
+        )
+
+        assert agent_integration._convert_message_to_dict(msg) == {
+            "type": "tool_use",
+            "tool_name": "Read",
+            "tool_input": {"path": "a.py"},
+        }
+
+    def test_result_message(self, agent_integration: AgentIntegration) -> None:
+        """Test result messages are reported as completion."""
+        from claude_agent_sdk import ResultMessage
+
+        msg = ResultMessage(
+            subtype="success",
+            duration_ms=10,
+            duration_api_ms=5,
+            is_error=False,
+            num_turns=1,
+            session_id="abc",
+            total_cost_usd=0.25,
+        )
+
+        assert agent_integration._convert_message_to_dict(msg) == {
+            "type": "complete",
+            "cost": 0.25,
+            "session_id": "abc",
+        }
+
+
+class TestErrorFormatting:
+    """Test user-facing error message formatting."""
+
+    def test_unknown_error_includes_type(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test unmapped errors fall back to type and message."""
+        message = agent_integration._format_error_message(ValueError("bad"))
+        assert message == "Error (ValueError): bad"
+
+    @pytest.mark.skipif(
+        agent_integration_module.SDK_TYPE != "agent",
+        reason="claude-agent-sdk not installed",
+    )
+    def test_sdk_errors_mapped(self, agent_integration: AgentIntegration) -> None:
+        """Test SDK errors, including subclasses, use their formatter."""
+        from claude_agent_sdk import CLINotFoundError, ProcessError
+
+        class CustomProcessError(ProcessError):
+            pass
+
+        assert agent_integration._format_error_message(CLINotFoundError()).startswith(
+            "Claude CLI not found"
+        )
+        assert agent_integration._format_error_message(
+            CustomProcessError("boom")
+        ).startswith("Claude process error: boom")
+
+
+class TestStreamCallbackDispatch:
+    """Test stream callback binding."""
+
+    def test_no_callback_binds_nothing(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test a missing callback produces no dispatcher."""
+        assert agent_integration._bind_stream_callback(None) is None
+
+    async def test_sync_and_async_callbacks_invoked(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test both sync and async callbacks receive updates."""
+        received = []
+
+        def sync_callback(update: StreamUpdate) -> None:
+            received.append(("sync", update.content))
+
+        async def async_callback(update: StreamUpdate) -> None:
+            received.append(("async", update.content))
+
+        update = StreamUpdate(type="text", content="hi")
+        await agent_integration._bind_stream_callback(sync_callback)(update)
+        await agent_integration._bind_stream_callback(async_callback)(update)
+
+        assert received == [("sync", "hi"), ("async", "hi")]
+
+    async def test_callback_errors_are_swallowed(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test a failing callback does not break the stream."""
+
+        async def failing_callback(update: StreamUpdate) -> None:
+            raise RuntimeError("boom")
+
+        dispatch = agent_integration._bind_stream_callback(failing_callback)
+        await dispatch(StreamUpdate(type="text", content="hi"))
+
+
+@pytest.mark.skipif(
+    agent_integration_module.SDK_TYPE != "agent",
+    reason="claude-agent-sdk not installed",
+)
+class TestAgentQueryStreaming:
+    """Test streaming through a stubbed ClaudeSDKClient."""
+
+    @pytest.fixture
+    def agent_integration(
+        self, agent_integration: AgentIntegration
+    ) -> AgentIntegration:
+        """Create agent integration with a fake client for user 1."""
+        from claude_agent_sdk import AssistantMessage, ResultMessage, TextBlock
+
+        async def receive_response():
+            yield AssistantMessage(content=[TextBlock(text="Hi")], model="claude")
+            yield ResultMessage(
+                subtype="success",
+                duration_ms=1,
+                duration_api_ms=1,
+                is_error=False,
+                num_turns=1,
+                session_id="s1",
+                total_cost_usd=0.1,
+            )
+
+        client = MagicMock()
+        client.query = AsyncMock()
+        client.receive_response = receive_response
+        agent_integration.clients[1] = client
+        return agent_integration
+
+    async def test_stream_without_callback_builds_no_updates(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test no StreamUpdate is allocated when nobody listens."""
+        with patch.object(agent_integration_module, "StreamUpdate") as update_cls:
+            responses = [r async for r in agent_integration.query(1, "hello")]
+
+        update_cls.assert_not_called()
+        assert [r["type"] for r in responses] == ["text", "complete"]
+
+    async def test_stream_with_callback(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test the callback sees every streamed response."""
+        updates = []
+
+        async def callback(update: StreamUpdate) -> None:
+            updates.append(update.type)
+
+        responses = [r async for r in agent_integration.query(1, "hello", callback)]
+
+        assert updates == ["text", "complete"]
+        assert len(responses) == 2
+
+
+class TestLazyOptions:
+    """Test SDK options are built on first use."""
+
+    async def test_initialize_defers_options(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test initialize() does not build options until they are needed."""
+        with patch.object(agent_integration, "_create_options") as create_options:
+            await agent_integration.initialize()
+            create_options.assert_not_called()
+
+            options = agent_integration._get_options()
+            agent_integration._get_options()
+
+        if agent_integration_module.SDK_AVAILABLE:
+            create_options.assert_called_once()
+            assert options is create_options.return_value
+        else:
+            assert options is None
+
+
+class TestDeadlines:
+    """Test the shared-deadline timeout helpers."""
+
+    async def test_with_deadline_returns_result(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test awaitables finishing in time return their result."""
+
+        async def quick() -> str:
+            return "done"
+
+        deadline = asyncio.get_running_loop().time() + 1
+        assert await agent_integration._with_deadline(quick(), deadline) == "done"
+
+    async def test_with_deadline_times_out(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test expiry raises TimeoutError."""
+        deadline = asyncio.get_running_loop().time() + 0.01
+        with pytest.raises(asyncio.TimeoutError):
+            await agent_integration._with_deadline(asyncio.sleep(1), deadline)
+
+    async def test_iter_with_deadline(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test streams are bounded by a single deadline."""
+
+        async def messages():
+            yield 1
+            yield 2
+            await asyncio.sleep(1)
+            yield 3
+
+        deadline = asyncio.get_running_loop().time() + 0.05
+        received = []
+        with pytest.raises(asyncio.TimeoutError):
+            async for item in agent_integration._iter_with_deadline(
+                messages(), deadline
+            ):
+                received.append(item)
+
+        assert received == [1, 2]
+
+    async def test_iter_with_deadline_runs_in_consumer_task(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test the stream is resumed from the consuming task, not new ones."""
+        consumer = asyncio.current_task()
+        tasks = set()
+
+        async def messages():
+            for item in range(3):
+                tasks.add(asyncio.current_task())
+                await asyncio.sleep(0)
+                yield item
+
+        deadline = asyncio.get_running_loop().time() + 1
+        received = [
+            item
+            async for item in agent_integration._iter_with_deadline(
+                messages(), deadline
+            )
+        ]
+
+        assert received == [0, 1, 2]
+        assert tasks == {consumer}
+
+    async def test_timeout_leaves_task_uncancelled(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test expiry does not leave a cancellation pending on the task."""
+        deadline = asyncio.get_running_loop().time() + 0.01
+        with pytest.raises(asyncio.TimeoutError):
+            await agent_integration._with_deadline(asyncio.sleep(1), deadline)
+
+        task = asyncio.current_task()
+        if hasattr(task, "cancelling"):
+            assert task.cancelling() == 0
+        # A later await in the same task is not cancelled
+        await asyncio.sleep(0.02)
+
+
+class TestCloseAll:
+    """Test bounded concurrent shutdown."""
+
+    async def test_close_all_bounds_concurrency(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test close_all never exceeds the concurrency limit."""
+        for uid in range(10):
+            agent_integration.clients[uid] = {}
+
+        in_flight = 0
+        peak = 0
+
+        async def slow_close(client: Any) -> None:
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+
+        with patch.object(agent_integration_module, "CLOSE_ALL_CONCURRENCY", 3):
+            with patch.object(agent_integration, "_close_impl", slow_close):
+                await agent_integration.close_all()
+
+        assert agent_integration.clients == {}
+        assert peak == 3
+
+
+@pytest.mark.skipif(
+    not agent_integration_module.SDK_AVAILABLE, reason="No Claude SDK installed"
+)
+class TestCodeSdkQuery:
+    """Test the legacy claude-code-sdk streaming path."""
+
+    async def test_streams_text_tools_and_completion(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test text, tool use and result messages are all surfaced."""
+        sdk = agent_integration_module
+
+        async def fake_query(prompt: str):
+            yield sdk.AssistantMessage(
+                content=[
+                    sdk.TextBlock(text="Reading"),
+                    sdk.ToolUseBlock(id="t1", name="Read", input={"p": "a"}),
+                ],
+                model="claude",
+            )
+            yield sdk.ResultMessage(
+                subtype="success",
+                duration_ms=1,
+                duration_api_ms=1,
+                is_error=False,
+                num_turns=1,
+                session_id="ignored",
+                total_cost_usd=0.5,
+            )
+
+        updates = []
+        session = {"session_id": "s1"}
+        with (
+            patch.object(
+                agent_integration, "_get_client", AsyncMock(return_value=session)
+            ),
+            patch.object(agent_integration, "_execute_code_sdk_query", fake_query),
+        ):
+            responses = [
+                r
+                async for r in agent_integration._query_code_sdk(
+                    1, "hi", lambda update: updates.append(update.content)
+                )
+            ]
+
+        assert [r["type"] for r in responses] == ["text", "tool_use", "complete"]
+        assert responses[1]["tool_name"] == "Read"
+        assert responses[2]["content"] == "Reading"
+        assert responses[2]["cost"] == 0.5
+        assert responses[2]["session_id"] == "s1"
+        assert responses[2]["tools_used"] == [{"name": "Read", "input": {"p": "a"}}]
+        assert updates == ["Reading"]
+
+
+class TestTextCoalescing:
+    """Test merging of consecutive text responses."""
+
+    @staticmethod
+    async def _stream(*responses: Dict[str, Any]):
+        for response in responses:
+            yield response
+
+    async def test_adjacent_text_merged_until_other_type(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test text bursts merge and other responses flush the buffer."""
+        stream = self._stream(
+            {"type": "text", "content": "a"},
+            {"type": "text", "content": "b"},
+            {"type": "text", "content": "c"},
+            {"type": "tool_use", "tool_name": "Read", "tool_input": {}},
+            {"type": "text", "content": "d"},
+        )
+
+        merged = [r async for r in agent_integration._coalesce_text(stream)]
+
+        assert merged == [
+            {"type": "text", "content": "a"},
+            {"type": "text", "content": "b\nc"},
+            {"type": "tool_use", "tool_name": "Read", "tool_input": {}},
+            {"type": "text", "content": "d"},
+        ]
+
+    async def test_first_text_not_held(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test the first text is passed on before the next message arrives."""
+        next_message = asyncio.Event()
+
+        async def stream():
+            yield {"type": "text", "content": "a"}
+            # Stands in for a long tool run with no further messages
+            await next_message.wait()
+            yield {"type": "text", "content": "b"}
+
+        coalesced = agent_integration._coalesce_text(stream())
+        first = await asyncio.wait_for(coalesced.__anext__(), 1)
+
+        assert first == {"type": "text", "content": "a"}
+        next_message.set()
+        assert [r async for r in coalesced] == [{"type": "text", "content": "b"}]
+
+    async def test_character_cap_flushes(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test the buffer is released once the character cap is reached."""
+        stream = self._stream(
+            {"type": "text", "content": "a"},
+            {"type": "text", "content": "x" * 3},
+            {"type": "text", "content": "y"},
+        )
+
+        with patch.object(agent_integration_module, "TEXT_COALESCE_MAX_CHARS", 2):
+            merged = [r async for r in agent_integration._coalesce_text(stream)]
+
+        assert [r["content"] for r in merged] == ["a", "xxx", "y"]
+
+
+class TestQueryLogContext:
+    """Test per-query log fields."""
+
+    async def test_query_logs_carry_user_id(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test the query's error log is tagged with user_id and sdk_type."""
+
+        async def failing_impl(user_id, prompt, stream_callback=None):
+            raise RuntimeError("boom")
+            yield
+
+        agent_integration._query_impl = failing_impl
+        with structlog.testing.capture_logs() as logs:
+            responses = [r async for r in agent_integration.query(42, "hi")]
+
+        assert responses[0]["type"] == "error"
+        failed = [log for log in logs if log["event"] == "Query failed"]
+        assert failed[0]["user_id"] == 42
+        assert failed[0]["sdk_type"] == agent_integration_module.SDK_TYPE
+
+    async def test_early_exit_leaves_no_log_context(
+        self, agent_integration: AgentIntegration
+    ) -> None:
+        """Test stopping iteration early binds nothing in the caller's context."""
+
+        async def fake_impl(user_id, prompt, stream_callback=None):
+            yield {"type": "error", "content": "failed"}
+            yield {"type": "text", "content": "unreached"}
+
+        agent_integration._query_impl = fake_impl
+        async for response in agent_integration.query(7, "hi"):
+            if response["type"] == "error":
+                break
+
+        assert structlog.contextvars.get_contextvars() == {}
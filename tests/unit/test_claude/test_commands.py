@@ -1,81 +1,162 @@
 """Test slash command discovery and expansion."""
 
+import shutil
 from pathlib import Path
-from typing import List
+from typing import Dict
 
 import pytest
 
+# Templates committed with the tests: speckit.specify, speckit.plan, ralph-loop
+TEST_COMMANDS_DIR = Path(__file__).parent / "testdata" / "commands"
+
+
+@pytest.fixture(scope="session")
+def shared_commands_dir() -> Path:
+    """Commands directory shared by tests that only read it."""
+    return TEST_COMMANDS_DIR
+
 
 class TestSlashCommandLoader:
     """Test SlashCommandLoader class."""
 
     @pytest.fixture
     def temp_commands_dir(self, tmp_path: Path) -> Path:
-        """Create temporary commands directory with test templates."""
+        """Copy the test templates to a directory the test may modify."""
         commands_dir = tmp_path / ".claude" / "commands"
-        commands_dir.mkdir(parents=True)
-
-        # Create test command templates
-        (commands_dir / "speckit.specify.md").write_text(
-            "# Specify Feature\n\n$ARGUMENTS\n\nCreate specification."
-        )
-        (commands_dir / "speckit.plan.md").write_text(
-            "# Plan Feature\n\nPlan implementation for $ARGUMENTS."
-        )
-        (commands_dir / "ralph-loop.md").write_text(
-            "Start Ralph Wiggum loop with: $ARGUMENTS"
-        )
-
+        shutil.copytree(TEST_COMMANDS_DIR, commands_dir)
         return commands_dir
 
-    async def test_loader_discovers_commands(self, temp_commands_dir: Path) -> None:
+    async def test_loader_discovers_commands(self, shared_commands_dir: Path) -> None:
         """Test that loader discovers command templates."""
         from src.claude.commands.loader import SlashCommandLoader
 
-        loader = SlashCommandLoader(temp_commands_dir)
+        loader = SlashCommandLoader(shared_commands_dir)
 
         commands = loader.list_commands()
         assert "speckit.specify" in commands
         assert "speckit.plan" in commands
         assert "ralph-loop" in commands
 
-    async def test_loader_expands_arguments(self, temp_commands_dir: Path) -> None:
+    async def test_loader_expands_arguments(self, shared_commands_dir: Path) -> None:
         """Test that loader expands $ARGUMENTS placeholder."""
         from src.claude.commands.loader import SlashCommandLoader
 
-        loader = SlashCommandLoader(temp_commands_dir)
+        loader = SlashCommandLoader(shared_commands_dir)
 
         expanded = loader.expand("speckit.specify", "add user login feature")
 
         assert "add user login feature" in expanded
         assert "$ARGUMENTS" not in expanded
 
-    async def test_loader_handles_unknown_command(
+    async def test_loader_expands_template_without_placeholder(
         self, temp_commands_dir: Path
+    ) -> None:
+        """Test templates without $ARGUMENTS are returned unchanged."""
+        from src.claude.commands.loader import SlashCommandLoader
+
+        (temp_commands_dir / "speckit.status.md").write_text("Show status.")
+        loader = SlashCommandLoader(temp_commands_dir)
+
+        assert loader.expand("speckit.status", "ignored") == "Show status."
+
+    async def test_loader_handles_unknown_command(
+        self, shared_commands_dir: Path
     ) -> None:
         """Test that loader raises error for unknown command."""
         from src.claude.commands.loader import SlashCommandLoader, UnknownCommandError
 
-        loader = SlashCommandLoader(temp_commands_dir)
+        loader = SlashCommandLoader(shared_commands_dir)
 
         with pytest.raises(UnknownCommandError) as exc_info:
             loader.expand("unknown.command", "args")
 
         assert "unknown.command" in str(exc_info.value)
+        assert exc_info.value.available_commands == (
+            "ralph-loop",
+            "speckit.plan",
+            "speckit.specify",
+        )
 
     async def test_loader_handles_empty_arguments(
-        self, temp_commands_dir: Path
+        self, shared_commands_dir: Path
     ) -> None:
         """Test that loader handles empty arguments."""
         from src.claude.commands.loader import SlashCommandLoader
 
-        loader = SlashCommandLoader(temp_commands_dir)
+        loader = SlashCommandLoader(shared_commands_dir)
 
         expanded = loader.expand("speckit.specify", "")
 
         # $ARGUMENTS should be replaced with empty string
         assert "$ARGUMENTS" not in expanded
 
+    async def test_reload_picks_up_changes(self, temp_commands_dir: Path) -> None:
+        """Test reload re-reads changed files and drops deleted ones."""
+        import os
+
+        from src.claude.commands.loader import SlashCommandLoader
+
+        loader = SlashCommandLoader(temp_commands_dir)
+
+        plan_file = temp_commands_dir / "speckit.plan.md"
+        plan_file.write_text("Updated plan for $ARGUMENTS, now longer.")
+        stat = plan_file.stat()
+        os.utime(plan_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        (temp_commands_dir / "ralph-loop.md").unlink()
+        (temp_commands_dir / "speckit.tasks.md").write_text("Tasks: $ARGUMENTS")
+
+        loader.reload()
+
+        assert sorted(loader.list_commands()) == [
+            "speckit.plan",
+            "speckit.specify",
+            "speckit.tasks",
+        ]
+        assert loader.expand("speckit.plan", "x") == "Updated plan for x, now longer."
+
+    async def test_reload_skips_unchanged_files(
+        self, shared_commands_dir: Path
+    ) -> None:
+        """Test reload does not re-read templates whose stat is unchanged."""
+        from unittest.mock import patch
+
+        from src.claude.commands.loader import SlashCommandLoader
+
+        loader = SlashCommandLoader(shared_commands_dir)
+
+        with patch("builtins.open", side_effect=AssertionError("re-read")):
+            loader.reload()
+
+        assert len(loader.list_commands()) == 3
+
+    async def test_executor_reload_commands_async(
+        self, temp_commands_dir: Path
+    ) -> None:
+        """Test executor reload picks up new templates off the event loop."""
+        from src.claude.commands.executor import CommandExecutor
+
+        executor = CommandExecutor(temp_commands_dir)
+        (temp_commands_dir / "speckit.tasks.md").write_text("Tasks: $ARGUMENTS")
+
+        await executor.reload_commands()
+
+        assert executor.has_command("speckit.tasks")
+        assert executor.loader.expand("speckit.tasks", "x") == "Tasks: x"
+
+    async def test_loader_accepts_in_memory_templates(self) -> None:
+        """Test templates given as a mapping are served without disk access."""
+        from unittest.mock import patch
+
+        from src.claude.commands.loader import SlashCommandLoader
+
+        with patch("os.scandir", side_effect=AssertionError("disk scan")):
+            loader = SlashCommandLoader({"b.cmd": "B $ARGUMENTS", "a.cmd": "A"})
+            loader.reload()
+
+        assert loader.list_commands() == ("a.cmd", "b.cmd")
+        assert loader.expand("b.cmd", "x") == "B x"
+        assert loader.expand("a.cmd", "x") == "A"
+
     async def test_loader_handles_missing_directory(self, tmp_path: Path) -> None:
         """Test that loader handles missing commands directory."""
         from src.claude.commands.loader import SlashCommandLoader
@@ -87,26 +168,23 @@ class TestSlashCommandLoader:
         assert len(loader.list_commands()) == 0
 
 
-class TestCommandExpansion:
-    """Test command template expansion."""
-
-    @pytest.fixture
-    def loader_with_templates(self, tmp_path: Path):
-        """Create loader with various template types."""
-        commands_dir = tmp_path / ".claude" / "commands"
-        commands_dir.mkdir(parents=True)
-
-        # Template with multiple argument placeholders
-        (commands_dir / "multi-args.md").write_text(
-            "First: $ARGUMENTS\nSecond: $ARGUMENTS"
-        )
+@pytest.fixture(scope="module")
+def loader_with_templates():
+    """Create loader with various template types, shared by the module."""
+    from src.claude.commands.loader import SlashCommandLoader
 
-        # Template with no arguments
-        (commands_dir / "no-args.md").write_text("This command takes no arguments.")
+    return SlashCommandLoader(
+        {
+            # Template with multiple argument placeholders
+            "multi-args": "First: $ARGUMENTS\nSecond: $ARGUMENTS",
+            # Template with no arguments
+            "no-args": "This command takes no arguments.",
+        }
+    )
 
-        from src.claude.commands.loader import SlashCommandLoader
 
-        return SlashCommandLoader(commands_dir)
+class TestCommandExpansion:
+    """Test command template expansion."""
 
     async def test_multiple_argument_placeholders(self, loader_with_templates) -> None:
         """Test expansion with multiple $ARGUMENTS."""
@@ -128,23 +206,18 @@ class TestCommandExecutor:
     """Test command executor."""
 
     @pytest.fixture
-    def temp_commands_dir(self, tmp_path: Path) -> Path:
-        """Create temporary commands directory."""
-        commands_dir = tmp_path / ".claude" / "commands"
-        commands_dir.mkdir(parents=True)
-
+    def templates(self) -> Dict[str, str]:
+        """Command templates served from memory."""
         # Use test.cmd pattern to match slash command regex (requires separator)
-        (commands_dir / "test.cmd.md").write_text("Test command: $ARGUMENTS")
-
-        return commands_dir
+        return {"test.cmd": "Test command: $ARGUMENTS"}
 
     async def test_executor_processes_slash_command(
-        self, temp_commands_dir: Path
+        self, templates: Dict[str, str]
     ) -> None:
         """Test that executor processes slash commands."""
         from src.claude.commands.executor import CommandExecutor
 
-        executor = CommandExecutor(temp_commands_dir)
+        executor = CommandExecutor(templates)
 
         # Use pattern with separator (test.cmd) to match slash command regex
         result = await executor.process_message("/test.cmd hello world")
@@ -154,12 +227,12 @@ class TestCommandExecutor:
         assert "hello world" in result["expanded_prompt"]
 
     async def test_executor_passes_through_regular_message(
-        self, temp_commands_dir: Path
+        self, templates: Dict[str, str]
     ) -> None:
         """Test that executor passes through non-command messages."""
         from src.claude.commands.executor import CommandExecutor
 
-        executor = CommandExecutor(temp_commands_dir)
+        executor = CommandExecutor(templates)
 
         result = await executor.process_message("regular message")
 
@@ -167,12 +240,12 @@ class TestCommandExecutor:
         assert result["original_message"] == "regular message"
 
     async def test_executor_handles_unknown_command(
-        self, temp_commands_dir: Path
+        self, templates: Dict[str, str]
     ) -> None:
         """Test that executor handles unknown slash commands."""
         from src.claude.commands.executor import CommandExecutor
 
-        executor = CommandExecutor(temp_commands_dir)
+        executor = CommandExecutor(templates)
 
         result = await executor.process_message("/unknown.command args")
 
@@ -180,88 +253,183 @@ class TestCommandExecutor:
         assert result["error"] is not None
         assert "unknown" in result["error"].lower()
         assert "available" in result["error"].lower()
+        assert "**Available commands:**\n  • `/test.cmd`\n" in result["error"]
 
+    async def test_unknown_command_without_commands(self, tmp_path: Path) -> None:
+        """Test the unknown command error when no templates exist."""
+        from src.claude.commands.executor import CommandExecutor
 
-class TestCommandQueue:
-    """Test command execution queue."""
+        executor = CommandExecutor(tmp_path / "nonexistent")
 
-    async def test_sequential_command_execution(self, tmp_path: Path) -> None:
-        """Test that commands are executed sequentially."""
-        import asyncio
+        result = await executor.process_message("/unknown.command args")
 
-        from src.claude.commands.executor import CommandExecutor
+        assert "(no commands discovered)" in result["error"]
 
-        commands_dir = tmp_path / ".claude" / "commands"
-        commands_dir.mkdir(parents=True)
-        # Use pattern with separator to match slash command regex
-        (commands_dir / "slow.exec.md").write_text("Slow command: $ARGUMENTS")
 
-        executor = CommandExecutor(commands_dir)
+class TestCommandQueue:
+    """Test command execution queue."""
 
-        # Track execution order
-        execution_order: List[int] = []
+    @pytest.mark.parametrize("n", [1, 2, 3])
+    async def test_sequential_command_execution(self, n: int) -> None:
+        """Test that each command is executed and expanded."""
+        from src.claude.commands.executor import CommandExecutor
 
-        async def track_execution(order: int):
-            result = await executor.process_message(f"/slow.exec command{order}")
-            execution_order.append(order)
-            return result
+        # Use pattern with separator to match slash command regex
+        executor = CommandExecutor({"slow.exec": "Slow command: $ARGUMENTS"})
 
-        # Execute multiple commands concurrently
-        await asyncio.gather(
-            track_execution(1),
-            track_execution(2),
-            track_execution(3),
-        )
+        result = await executor.process_message(f"/slow.exec command{n}")
 
-        # All should complete (order may vary without proper queueing)
-        assert len(execution_order) == 3
+        assert result["is_command"] is True
+        assert result["expanded_prompt"] == f"Slow command: command{n}"
 
-    async def test_command_in_progress_rejection(self, tmp_path: Path) -> None:
+    async def test_command_in_progress_rejection(self) -> None:
         """Test that rapid commands are handled properly."""
         from src.claude.commands.executor import CommandExecutor
 
-        commands_dir = tmp_path / ".claude" / "commands"
-        commands_dir.mkdir(parents=True)
         # Use pattern with separator to match slash command regex
-        (commands_dir / "test.run.md").write_text("Test: $ARGUMENTS")
-
-        executor = CommandExecutor(commands_dir)
+        executor = CommandExecutor({"test.run": "Test: $ARGUMENTS"})
 
         # Process command with proper format (requires separator in name)
         result = await executor.process_message("/test.run first")
         assert result["is_command"] is True
 
+    async def test_busy_user_rejected_until_complete(self) -> None:
+        """Test a user with a command in flight is rejected, then released."""
+        from src.claude.commands.executor import CommandExecutor
+
+        executor = CommandExecutor({"test.run": "Test: $ARGUMENTS"})
+
+        result = await executor.process_message("/test.run first", user_id=1)
+        assert result["error"] is None
+        assert executor.is_user_processing(1) is False
+
+        executor._processing.add(1)
+        result = await executor.process_message("/test.run second", user_id=1)
+        assert "already in progress" in result["error"]
+
+        await executor.mark_complete(1)
+        assert executor.is_user_processing(1) is False
+
 
 class TestCommandDetection:
     """Test slash command pattern detection."""
 
-    async def test_speckit_commands_detected(self) -> None:
+    @pytest.mark.parametrize(
+        "message",
+        ["/speckit.specify args", "/speckit.plan", "/speckit.tasks args"],
+    )
+    async def test_speckit_commands_detected(self, message: str) -> None:
         """Test that /speckit.* commands are detected."""
         from src.claude.commands.executor import is_slash_command
 
-        assert is_slash_command("/speckit.specify args") is True
-        assert is_slash_command("/speckit.plan") is True
-        assert is_slash_command("/speckit.tasks args") is True
+        assert is_slash_command(message) is True
 
-    async def test_ralph_commands_detected(self) -> None:
+    @pytest.mark.parametrize("message", ["/ralph-loop args", "/ralph-stop"])
+    async def test_ralph_commands_detected(self, message: str) -> None:
         """Test that /ralph-* commands are detected."""
         from src.claude.commands.executor import is_slash_command
 
-        assert is_slash_command("/ralph-loop args") is True
-        assert is_slash_command("/ralph-stop") is True
-
-    async def test_regular_messages_not_detected(self) -> None:
+        assert is_slash_command(message) is True
+
+    @pytest.mark.parametrize(
+        "message",
+        [
+            "regular message",
+            "/help",  # Built-in, not slash command
+            "not /a command",
+        ],
+    )
+    async def test_regular_messages_not_detected(self, message: str) -> None:
         """Test that regular messages are not detected as commands."""
         from src.claude.commands.executor import is_slash_command
 
-        assert is_slash_command("regular message") is False
-        assert is_slash_command("/help") is False  # Built-in, not slash command
-        assert is_slash_command("not /a command") is False
+        assert is_slash_command(message) is False
+
+    async def test_detection_matches_parsing(self) -> None:
+        """Test detection agrees with parsing, including long arguments."""
+        from src.claude.commands.executor import (
+            is_slash_command,
+            parse_slash_command,
+        )
 
-    async def test_custom_commands_detected(self) -> None:
+        for message in (
+            "  /speckit.specify " + "x" * 4000,
+            "/speckit.",
+            "/a.b",
+            "/ab",
+            "\n/ralph-loop\nline two",
+        ):
+            expected = parse_slash_command(message) is not None
+            assert is_slash_command(message) is expected
+
+    @pytest.mark.parametrize("message", ["/custom.command args", "/my-command"])
+    async def test_custom_commands_detected(self, message: str) -> None:
         """Test that custom command patterns work."""
         from src.claude.commands.executor import is_slash_command
 
         # Any /word.word or /word-word pattern should match
-        assert is_slash_command("/custom.command args") is True
-        assert is_slash_command("/my-command") is True
+        assert is_slash_command(message) is True
+
+    async def test_multiline_arguments_parsed(self) -> None:
+        """Test arguments spanning several lines are kept intact."""
+        from src.claude.commands.executor import parse_slash_command
+
+        parsed = parse_slash_command("/speckit.specify first line\nsecond line\n")
+
+        assert parsed == {
+            "command": "speckit.specify",
+            "arguments": "first line\nsecond line",
+        }
+
+
+class TestExecutorRegistry:
+    """Test the module-level executor accessors."""
+
+    async def test_get_executor_is_per_directory(self, tmp_path: Path) -> None:
+        """Test distinct directories get distinct shared executors."""
+        from src.claude.commands import executor as executor_module
+
+        first_dir = tmp_path / "first"
+        second_dir = tmp_path / "second"
+
+        try:
+            first = executor_module.get_executor(first_dir)
+            assert executor_module.get_executor(first_dir) is first
+            assert executor_module.get_executor(second_dir) is not first
+        finally:
+            executor_module._executors.pop(first_dir, None)
+            executor_module._executors.pop(second_dir, None)
+
+    async def test_executors_are_never_evicted(self, tmp_path: Path) -> None:
+        """Test an executor keeps its busy state however many dirs are used."""
+        from src.claude.commands import executor as executor_module
+
+        dirs = [tmp_path / str(i) for i in range(20)]
+
+        try:
+            first = executor_module.get_executor(dirs[0])
+            first._processing.add(12345)
+            for commands_dir in dirs[1:]:
+                executor_module.get_executor(commands_dir)
+
+            assert executor_module.get_executor(dirs[0]) is first
+            assert first.is_user_processing(12345)
+        finally:
+            for commands_dir in dirs:
+                executor_module._executors.pop(commands_dir, None)
+
+    async def test_set_executor_overrides_default(self, tmp_path: Path) -> None:
+        """Test set_executor replaces the default only."""
+        from src.claude.commands import executor as executor_module
+
+        shared = executor_module.get_executor(tmp_path)
+        override = executor_module.CommandExecutor(tmp_path)
+        previous = executor_module._default_executor
+
+        try:
+            executor_module.set_executor(override)
+            assert executor_module.get_executor() is override
+            assert executor_module.get_executor(tmp_path) is shared
+        finally:
+            executor_module._default_executor = previous
+            executor_module._executors.pop(tmp_path, None)
@@ -0,0 +1,524 @@
+"""Test the ClaudeIntegration facade."""
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.claude import facade as facade_module
+from src.claude.agent_integration import AgentIntegration
+from src.claude.facade import ClaudeIntegration
+from src.config.settings import Settings
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> Settings:
+    """Create test settings."""
+    return Settings(
+        telegram_bot_token="test:token",
+        telegram_bot_username="testbot",
+        approved_directory=tmp_path,
+        claude_allowed_tools=["Read", "Bash"],
+    )
+
+
+@pytest.fixture
+def integration(config: Settings) -> ClaudeIntegration:
+    """Create a facade with mocked managers."""
+    agent = MagicMock(spec=AgentIntegration)
+    agent.is_sdk_available = True
+    return ClaudeIntegration(
+        config=config,
+        process_manager=MagicMock(),
+        sdk_manager=MagicMock(),
+        agent_integration=agent,
+        session_manager=MagicMock(),
+        tool_monitor=MagicMock(),
+    )
+
+
+class TestToolErrorMessages:
+    """Test tool validation error message construction."""
+
+    async def test_admin_instructions_cached(
+        self, integration: ClaudeIntegration
+    ) -> None:
+        """Test repeated blocked tools reuse the rendered instructions."""
+        facade_module._render_admin_instructions.cache_clear()
+
+        first = integration._get_admin_instructions(["Task"])
+        second = integration._get_admin_instructions(["Task"])
+
+        assert first is second
+        assert 'CLAUDE_ALLOWED_TOOLS="Read,Write,Edit,' in first
+        assert facade_module._render_admin_instructions.cache_info().hits == 1
+
+    async def test_admin_instructions_keep_blocked_tool_order(
+        self, integration: ClaudeIntegration
+    ) -> None:
+        """Test blocked tools are listed in the order they were reported."""
+        instructions = integration._get_admin_instructions(["Zeta", "Alpha", "Mu"])
+
+        assert ',WebSearch,Zeta,Alpha,Mu"' in instructions
+
+    async def test_admin_instructions_empty_without_blocked_tools(
+        self, integration: ClaudeIntegration
+    ) -> None:
+        """Test no instructions are generated when nothing was blocked."""
+        assert integration._get_admin_instructions([]) == ""
+
+    async def test_tool_error_message_cached(
+        self, integration: ClaudeIntegration
+    ) -> None:
+        """Test repeated failures reuse the rendered error message."""
+        admin = integration._get_admin_instructions(["Task"])
+
+        first = integration._create_tool_error_message(
+            ["Task"], ["Read", "Bash"], admin
+        )
+        second = integration._create_tool_error_message(
+            ["Task"], ["Read", "Bash"], admin
+        )
+
+        assert first is second
+        assert "`Task`" in first
+        assert "`Read`, `Bash`" in first
+        assert first.endswith(admin)
+
+    async def test_tool_error_message_keeps_blocked_tool_order(
+        self, integration: ClaudeIntegration
+    ) -> None:
+        """Test blocked tools are listed in the order they were reported."""
+        message = integration._create_tool_error_message(["Zeta", "Alpha"], [], "")
+
+        assert "`Zeta`, `Alpha`" in message
+
+    async def test_tool_error_message_without_allowed_tools(
+        self, integration: ClaudeIntegration
+    ) -> None:
+        """Test the allowed tools section when nothing is allowed."""
+        message = integration._create_tool_error_message(["Task"], [], "")
+
+        assert "**Currently allowed tools:**\nNone" in message
+
+
+class TestContinueSession:
+    """Test resuming the most recent session."""
+
+    async def test_picks_latest_non_temporary_session(
+        self, integration: ClaudeIntegration, tmp_path: Path
+    ) -> None:
+        """Test the newest real session in the directory is continued."""
+        now = datetime.now(timezone.utc)
+
+        def session(session_id: str, path: Path, age_minutes: int) -> MagicMock:
+            s = MagicMock()
+            s.session_id = session_id
+            s.project_path = path
+            s.last_used = now - timedelta(minutes=age_minutes)
+            return s
+
+        integration.session_manager._get_user_sessions = AsyncMock(
+            return_value=[
+                session("old", tmp_path, 30),
+                session("temp_new", tmp_path, 0),
+                session("other-dir", tmp_path / "other", 1),
+                session("latest", tmp_path, 5),
+            ]
+        )
+        integration.run_command = AsyncMock(return_value="response")
+
+        result = await integration.continue_session(1, tmp_path, "hi")
+
+        assert result == "response"
+        assert integration.run_command.await_args.kwargs["session_id"] == "latest"
+
+    async def test_returns_none_without_matching_session(
+        self, integration: ClaudeIntegration, tmp_path: Path
+    ) -> None:
+        """Test nothing is continued when no session matches."""
+        integration.session_manager._get_user_sessions = AsyncMock(return_value=[])
+        integration.run_command = AsyncMock()
+
+        assert await integration.continue_session(1, tmp_path) is None
+        integration.run_command.assert_not_awaited()
+
+
+class TestUserSessions:
+    """Test session summaries for a user."""
+
+    async def test_get_user_sessions_summaries(
+        self, integration: ClaudeIntegration, tmp_path: Path
+    ) -> None:
+        """Test each session is reported with its fields and expiry."""
+        from src.claude.session import ClaudeSession
+
+        now = datetime.now(timezone.utc)
+        stale = now - timedelta(hours=integration.config.session_timeout_hours + 1)
+        sessions = [
+            ClaudeSession("s1", 1, tmp_path, now, now, 0.5, 2, 3, ["Read"]),
+            ClaudeSession("s2", 1, tmp_path, stale, stale),
+        ]
+        integration.session_manager._get_user_sessions = AsyncMock(
+            return_value=sessions
+        )
+
+        summaries = await integration.get_user_sessions(1)
+
+        assert summaries[0] == {
+            "session_id": "s1",
+            "project_path": str(tmp_path),
+            "created_at": now.isoformat(),
+            "last_used": now.isoformat(),
+            "total_cost": 0.5,
+            "message_count": 3,
+            "tools_used": ["Read"],
+            "expired": False,
+        }
+        assert summaries[1]["expired"] is True
+
+
+class TestLegacyManagers:
+    """Test lazy creation of the legacy fallback managers."""
+
+    async def test_not_created_when_agent_sdk_available(self, config: Settings) -> None:
+        """Test the Agent SDK path does not build fallback managers."""
+        agent = MagicMock()
+        agent.is_sdk_available = True
+
+        integration = ClaudeIntegration(config=config, agent_integration=agent)
+
+        assert integration.manager is agent
+        assert "process_manager" not in vars(integration)
+        assert "sdk_manager" not in vars(integration)
+
+    async def test_created_on_first_access(self, config: Settings) -> None:
+        """Test the subprocess manager is built once when first needed."""
+        from src.claude.integration import ClaudeProcessManager
+
+        agent = MagicMock()
+        agent.is_sdk_available = True
+        integration = ClaudeIntegration(config=config, agent_integration=agent)
+
+        manager = integration.process_manager
+
+        assert isinstance(manager, ClaudeProcessManager)
+        assert integration.process_manager is manager
+
+    async def test_subprocess_selected_without_agent_sdk(
+        self, config: Settings
+    ) -> None:
+        """Test the subprocess manager is used when no SDK is available."""
+        agent = MagicMock()
+        agent.is_sdk_available = False
+        config.use_sdk = False
+        process_manager = MagicMock()
+
+        integration = ClaudeIntegration(
+            config=config,
+            agent_integration=agent,
+            process_manager=process_manager,
+        )
+
+        assert integration.manager is process_manager
+        assert integration.sdk_manager is None
+
+
+class TestRunCommandStreaming:
+    """Test tool validation while a command streams."""
+
+    @pytest.fixture
+    def session(self, tmp_path: Path):
+        """Create an existing session."""
+        from src.claude.session import ClaudeSession
+
+        now = datetime.now(timezone.utc)
+        return ClaudeSession("s1", 1, tmp_path, now, now)
+
+    def _run_with_updates(self, integration: ClaudeIntegration, session, updates):
+        """Make the executor feed ``updates`` to the stream handler."""
+        from src.claude.integration import ClaudeResponse
+
+        integration.session_manager.get_or_create_session = AsyncMock(
+            return_value=session
+        )
+        integration.session_manager.update_session = AsyncMock()
+
+        async def execute(**kwargs):
+            for update in updates:
+                await kwargs["stream_callback"](update)
+            return ClaudeResponse(
+                content="done", session_id="s1", cost=0.0, duration_ms=0, num_turns=1
+            )
+
+        integration._execute_with_fallback = execute
+
+    async def test_new_session_not_continued(
+        self, integration: ClaudeIntegration, session, tmp_path: Path
+    ) -> None:
+        """Test a new session's temporary id is not sent to Claude."""
+        from src.claude.integration import ClaudeResponse
+
+        session.is_new_session = True
+        integration.session_manager.get_or_create_session = AsyncMock(
+            return_value=session
+        )
+        integration.session_manager.update_session = AsyncMock()
+        integration._execute_with_fallback = AsyncMock(
+            return_value=ClaudeResponse(
+                content="ok",
+                session_id="claude-1",
+                cost=0.0,
+                duration_ms=0,
+                num_turns=1,
+            )
+        )
+
+        response = await integration.run_command("hello", tmp_path, 1, "s1")
+
+        kwargs = integration._execute_with_fallback.await_args.kwargs
+        assert kwargs["session_id"] is None
+        assert kwargs["continue_session"] is False
+        assert response.session_id == "claude-1"
+
+    async def test_text_updates_skip_validation(
+        self, integration: ClaudeIntegration, session, tmp_path: Path
+    ) -> None:
+        """Test text-only chunks are not validated."""
+        from src.claude.integration import StreamUpdate
+
+        integration.tool_monitor.validate_tool_call = AsyncMock()
+        self._run_with_updates(
+            integration, session, [StreamUpdate(type="assistant", content="hi")]
+        )
+
+        response = await integration.run_command("hello", tmp_path, 1, "s1")
+
+        assert response.is_error is False
+        integration.tool_monitor.validate_tool_call.assert_not_awaited()
+
+    async def test_blocked_tool_reported(
+        self, integration: ClaudeIntegration, session, tmp_path: Path
+    ) -> None:
+        """Test a blocked non-critical tool marks the response as failed."""
+        from src.claude.integration import StreamUpdate
+
+        integration.tool_monitor.validate_tool_call = AsyncMock(
+            return_value=(False, "Tool not allowed: WebFetch")
+        )
+        on_stream = AsyncMock()
+        self._run_with_updates(
+            integration,
+            session,
+            [StreamUpdate(type="assistant", tool_calls=[{"name": "WebFetch"}])],
+        )
+
+        response = await integration.run_command(
+            "hello", tmp_path, 1, "s1", on_stream=on_stream
+        )
+
+        assert response.is_error is True
+        assert response.error_type == "tool_validation_failed"
+        assert "`WebFetch`" in response.content
+        assert "**Currently allowed tools:**\n`Read`, `Bash`" in response.content
+        on_stream.assert_awaited_once()
+
+    async def test_blocked_critical_tool_fails_fast(
+        self, integration: ClaudeIntegration, session, tmp_path: Path
+    ) -> None:
+        """Test a blocked critical tool aborts the command."""
+        from src.claude.exceptions import ClaudeToolValidationError
+        from src.claude.integration import StreamUpdate
+
+        integration.tool_monitor.validate_tool_call = AsyncMock(
+            return_value=(False, "Tool not allowed: Task")
+        )
+        self._run_with_updates(
+            integration,
+            session,
+            [StreamUpdate(type="assistant", tool_calls=[{"name": "Task"}])],
+        )
+
+        with pytest.raises(ClaudeToolValidationError) as exc_info:
+            await integration.run_command("hello", tmp_path, 1, "s1")
+
+        assert exc_info.value.blocked_tools == ["Task"]
+        assert "`Task`" in str(exc_info.value)
+
+
+class TestAgentExecution:
+    """Test consuming Agent SDK responses."""
+
+    def _agent_yields(self, integration: ClaudeIntegration, responses):
+        """Make the agent's query yield ``responses``."""
+
+        async def query(**kwargs):
+            for response in responses:
+                yield response
+
+        integration.agent_integration.query = query
+
+    async def test_collects_agent_responses(
+        self, integration: ClaudeIntegration, tmp_path: Path
+    ) -> None:
+        """Test text, tool use and completion are folded into one response."""
+        self._agent_yields(
+            integration,
+            [
+                {"type": "text", "content": "first"},
+                {"type": "tool_use", "tool_name": "Read", "tool_input": {"p": 1}},
+                {"type": "text", "content": "second"},
+                {"type": "complete", "cost": 0.25, "session_id": "sdk-1"},
+            ],
+        )
+
+        response = await integration._execute_with_fallback("hi", tmp_path)
+
+        assert response.content == "first\nsecond"
+        assert response.tools_used == [{"name": "Read", "input": {"p": 1}}]
+        assert response.cost == 0.25
+        assert response.session_id == "sdk-1"
+        assert response.is_error is False
+
+    async def test_agent_error_response(
+        self, integration: ClaudeIntegration, tmp_path: Path
+    ) -> None:
+        """Test an error message from the agent becomes an error response."""
+        self._agent_yields(
+            integration,
+            [{"type": "error", "content": "boom", "error_type": "timeout"}],
+        )
+
+        response = await integration._execute_with_fallback(
+            "hi", tmp_path, session_id="s1"
+        )
+
+        assert response.is_error is True
+        assert response.content == "boom"
+        assert response.error_type == "timeout"
+        assert response.session_id == "s1"
+
+    async def test_stream_updates_converted_for_caller(
+        self, integration: ClaudeIntegration, tmp_path: Path
+    ) -> None:
+        """Test agent stream updates reach the caller as legacy updates."""
+        from src.claude.agent_integration import StreamUpdate as AgentStreamUpdate
+
+        async def query(stream_callback=None, **kwargs):
+            await stream_callback(AgentStreamUpdate(type="text", content="hi"))
+            await stream_callback(
+                AgentStreamUpdate(type="tool_use", tool_name="Read", tool_input={})
+            )
+            yield {"type": "complete", "cost": 0.0}
+
+        integration.agent_integration.query = query
+        received = []
+
+        await integration._execute_with_fallback(
+            "hi", tmp_path, stream_callback=received.append
+        )
+
+        assert [(u.type, u.content, u.tool_calls) for u in received] == [
+            ("assistant", "hi", None),
+            ("assistant", "", [{"name": "Read", "input": {}}]),
+        ]
+
+    async def test_no_stream_handler_without_caller_callback(
+        self, integration: ClaudeIntegration, tmp_path: Path
+    ) -> None:
+        """Test the agent is not given a callback when nobody listens."""
+        seen = {}
+
+        async def query(stream_callback=None, **kwargs):
+            seen["stream_callback"] = stream_callback
+            yield {"type": "complete", "cost": 0.0}
+
+        integration.agent_integration.query = query
+
+        await integration._execute_with_fallback("hi", tmp_path)
+
+        assert seen["stream_callback"] is None
+
+
+class TestShutdown:
+    """Test integration shutdown."""
+
+    async def test_shutdown_runs_steps_concurrently(
+        self, integration: ClaudeIntegration
+    ) -> None:
+        """Test every shutdown step starts before any of them finishes."""
+        import asyncio
+
+        started = []
+        all_started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def step(name: str) -> int:
+            started.append(name)
+            if len(started) == 2:
+                all_started.set()
+            await release.wait()
+            return 0
+
+        integration.agent_integration.close_all = lambda: step("close_all")
+        integration.session_manager.cleanup_expired_sessions = lambda: step("cleanup")
+
+        shutdown = asyncio.create_task(integration.shutdown())
+        await asyncio.wait_for(all_started.wait(), timeout=1)
+
+        assert sorted(started) == ["cleanup", "close_all"]
+        release.set()
+        await shutdown
+
+    async def test_shutdown_reports_failure_after_all_steps(
+        self, integration: ClaudeIntegration
+    ) -> None:
+        """Test a failing step does not stop the others."""
+        integration.agent_integration.close_all = AsyncMock(
+            side_effect=RuntimeError("close failed")
+        )
+        integration.session_manager.cleanup_expired_sessions = AsyncMock(return_value=0)
+
+        with pytest.raises(RuntimeError, match="close failed"):
+            await integration.shutdown()
+
+        integration.session_manager.cleanup_expired_sessions.assert_awaited_once()
+
+
+class TestSlashCommands:
+    """Test slash command handling in run_command."""
+
+    async def test_slash_command_parsed_once(
+        self, integration: ClaudeIntegration, tmp_path: Path
+    ) -> None:
+        """Test the executor receives the already parsed command."""
+        integration.command_executor = MagicMock()
+        integration.command_executor.process_message = AsyncMock(
+            return_value={"error": "Unknown command"}
+        )
+
+        response = await integration.run_command("/speckit.plan now", tmp_path, 1)
+
+        assert response.is_error is True
+        assert response.error_type == "command_error"
+        integration.command_executor.process_message.assert_awaited_once_with(
+            "/speckit.plan now",
+            1,
+            parsed={"command": "speckit.plan", "arguments": "now"},
+        )
+
+    async def test_plain_prompt_skips_executor(
+        self, integration: ClaudeIntegration, tmp_path: Path
+    ) -> None:
+        """Test ordinary prompts never reach the command executor."""
+        integration.command_executor = MagicMock()
+        integration.command_executor.process_message = AsyncMock()
+        integration.session_manager.get_or_create_session = AsyncMock(
+            side_effect=RuntimeError("stop here")
+        )
+
+        with pytest.raises(RuntimeError, match="stop here"):
+            await integration.run_command("hello there", tmp_path, 1)
+
+        integration.command_executor.process_message.assert_not_awaited()
@@ -4,37 +4,64 @@ These tests verify that all existing functionality continues to work
 after migrating from claude-code-sdk to claude-agent-sdk.
 """
 
+import asyncio
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List
 
 import pytest
+import pytest_asyncio
 
 from src.claude.agent_integration import AgentIntegration
 from src.config.settings import Settings
 
+# The tests here keep no loop state between them, so they share one event
+# loop instead of each creating and closing its own. Under pytest-xdist's
+# --dist=loadgroup they stay on one worker, which builds the module-scoped
+# fixtures once.
+pytestmark = [
+    pytest.mark.asyncio(loop_scope="module"),
+    pytest.mark.xdist_group("migration_parity"),
+]
+
+# Required Settings fields, other than the approved directory
+REQUIRED_SETTINGS: Dict[str, Any] = {
+    "telegram_bot_token": "test:token",
+    "telegram_bot_username": "testbot",
+}
+
+
+@pytest.fixture(scope="module")
+def config(tmp_path_factory: pytest.TempPathFactory) -> Settings:
+    """Create test config matching existing behavior, shared by the module."""
+    return Settings(
+        **REQUIRED_SETTINGS,
+        approved_directory=tmp_path_factory.mktemp("approved"),
+        use_sdk=True,
+        claude_max_turns=10,
+        claude_timeout_seconds=30,
+        permission_mode="acceptEdits",
+        enable_telegram_tools=True,
+        enable_security_hooks=True,
+    )
+
+
+@pytest.fixture(scope="module")
+def agent_integration(config: Settings) -> AgentIntegration:
+    """Create agent integration, shared by the module."""
+    return AgentIntegration(config=config, telegram_context=None)
+
 
 class TestMigrationParity:
     """Test that existing features work with new SDK."""
 
-    @pytest.fixture
-    def config(self, tmp_path: Path) -> Settings:
-        """Create test config matching existing behavior."""
-        return Settings(
-            telegram_bot_token="test:token",
-            telegram_bot_username="testbot",
-            approved_directory=tmp_path,
-            use_sdk=True,
-            claude_max_turns=10,
-            claude_timeout_seconds=30,
-            permission_mode="acceptEdits",
-            enable_telegram_tools=True,
-            enable_security_hooks=True,
-        )
-
-    @pytest.fixture
-    def agent_integration(self, config: Settings) -> AgentIntegration:
-        """Create agent integration."""
-        return AgentIntegration(config=config, telegram_context=None)
+    @pytest_asyncio.fixture(autouse=True, loop_scope="module")
+    async def close_sessions(
+        self, agent_integration: AgentIntegration
+    ) -> AsyncIterator[None]:
+        """Close the sessions a test opened and check it left no tasks."""
+        yield
+        await agent_integration.close_all()
+        assert asyncio.all_tasks() == {asyncio.current_task()}
 
     async def test_basic_message_handling(
         self, agent_integration: AgentIntegration
@@ -43,9 +70,7 @@ class TestMigrationParity:
         user_id = 12345
         message = "List files in current directory"
 
-        responses: List[Dict[str, Any]] = []
-        async for response in agent_integration.query(user_id, message):
-            responses.append(response)
+        responses = [r async for r in agent_integration.query(user_id, message)]
 
         # Should get at least one response
         assert len(responses) >= 1
@@ -59,14 +84,10 @@ class TestMigrationParity:
         user_id = 12345
 
         # First message
-        responses1: List[Dict[str, Any]] = []
-        async for response in agent_integration.query(user_id, "Hello"):
-            responses1.append(response)
+        responses1 = [r async for r in agent_integration.query(user_id, "Hello")]
 
         # Second message should use same session
-        responses2: List[Dict[str, Any]] = []
-        async for response in agent_integration.query(user_id, "Follow up"):
-            responses2.append(response)
+        responses2 = [r async for r in agent_integration.query(user_id, "Follow up")]
 
         # Both should succeed
         assert len(responses1) >= 1
@@ -78,15 +99,14 @@ class TestMigrationParity:
         """Test multiple users have isolated sessions."""
         user1, user2 = 111, 222
 
-        # User 1 sends message
-        responses1: List[Dict[str, Any]] = []
-        async for response in agent_integration.query(user1, "User 1 message"):
-            responses1.append(response)
+        async def drain(user_id: int, message: str) -> List[Dict[str, Any]]:
+            return [r async for r in agent_integration.query(user_id, message)]
 
-        # User 2 sends message
-        responses2: List[Dict[str, Any]] = []
-        async for response in agent_integration.query(user2, "User 2 message"):
-            responses2.append(response)
+        # Both users send a message at the same time
+        responses1, responses2 = await asyncio.gather(
+            drain(user1, "User 1 message"),
+            drain(user2, "User 2 message"),
+        )
 
         # Both should get responses
         assert len(responses1) >= 1
@@ -107,81 +127,59 @@ class TestMigrationParity:
         assert user_id not in agent_integration.clients
 
 
+@pytest.fixture(scope="module")
+def tmp_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Create temporary directory, shared by the module."""
+    return tmp_path_factory.mktemp("configured")
+
+
 class TestConfigurationParity:
     """Test configuration options work as before."""
 
-    @pytest.fixture
-    def tmp_dir(self, tmp_path: Path) -> Path:
-        """Create temporary directory."""
-        return tmp_path
-
-    async def test_max_turns_respected(self, tmp_dir: Path) -> None:
-        """Test max_turns configuration is used."""
+    @pytest.mark.parametrize(
+        "overrides",
+        [
+            {"claude_max_turns": 5},
+            {"claude_timeout_seconds": 60, "tool_timeout_seconds": 15},
+            {"claude_allowed_tools": ["Read", "Write", "Bash"]},
+            {},
+        ],
+        ids=["max_turns", "timeouts", "allowed_tools", "working_directory"],
+    )
+    async def test_setting_passthrough(
+        self, tmp_dir: Path, overrides: Dict[str, Any]
+    ) -> None:
+        """Test configured values reach the integration unchanged."""
         config = Settings(
-            telegram_bot_token="test:token",
-            telegram_bot_username="testbot",
+            **REQUIRED_SETTINGS,
             approved_directory=tmp_dir,
-            claude_max_turns=5,
+            **overrides,
         )
         integration = AgentIntegration(config=config, telegram_context=None)
-        assert integration.config.claude_max_turns == 5
 
-    async def test_timeout_configuration(self, tmp_dir: Path) -> None:
-        """Test timeout configuration is used."""
-        config = Settings(
-            telegram_bot_token="test:token",
-            telegram_bot_username="testbot",
-            approved_directory=tmp_dir,
-            claude_timeout_seconds=60,
-            tool_timeout_seconds=15,
-        )
-        integration = AgentIntegration(config=config, telegram_context=None)
-        assert integration.config.claude_timeout_seconds == 60
-        assert integration.config.tool_timeout_seconds == 15
+        assert integration.config.approved_directory == tmp_dir
+        for field, value in overrides.items():
+            assert getattr(integration.config, field) == value
 
-    async def test_allowed_tools_configuration(self, tmp_dir: Path) -> None:
-        """Test allowed_tools configuration is preserved."""
-        allowed_tools = ["Read", "Write", "Bash"]
-        config = Settings(
-            telegram_bot_token="test:token",
-            telegram_bot_username="testbot",
-            approved_directory=tmp_dir,
-            claude_allowed_tools=allowed_tools,
-        )
-        integration = AgentIntegration(config=config, telegram_context=None)
-        assert integration.config.claude_allowed_tools == allowed_tools
 
-    async def test_working_directory_configuration(self, tmp_dir: Path) -> None:
-        """Test approved_directory configuration is used."""
-        config = Settings(
-            telegram_bot_token="test:token",
-            telegram_bot_username="testbot",
-            approved_directory=tmp_dir,
-        )
-        integration = AgentIntegration(config=config, telegram_context=None)
-        assert integration.config.approved_directory == tmp_dir
+@pytest.fixture(scope="module")
+def minimal_config(tmp_path_factory: pytest.TempPathFactory) -> Settings:
+    """Create config with only the required fields, shared by the module."""
+    return Settings(
+        **REQUIRED_SETTINGS,
+        approved_directory=tmp_path_factory.mktemp("minimal"),
+    )
 
 
 class TestErrorHandlingParity:
     """Test error handling works as before."""
 
-    @pytest.fixture
-    def config(self, tmp_path: Path) -> Settings:
-        """Create test config."""
-        return Settings(
-            telegram_bot_token="test:token",
-            telegram_bot_username="testbot",
-            approved_directory=tmp_path,
-        )
-
-    async def test_graceful_error_response(self, config: Settings) -> None:
+    async def test_graceful_error_response(self, minimal_config: Settings) -> None:
         """Test errors return graceful responses."""
-        integration = AgentIntegration(config=config, telegram_context=None)
+        integration = AgentIntegration(config=minimal_config, telegram_context=None)
 
         # Query without initialization should still return response
-        responses: List[Dict[str, Any]] = []
-        async for response in integration.query(12345, "Test"):
-            responses.append(response)
+        responses = [r async for r in integration.query(12345, "Test")]
 
         # Should get a response (even if error/stub)
         assert len(responses) >= 1
@@ -4,66 +4,79 @@ These tests verify session lifecycle, interrupt handling, and
 integration with the Claude Agent SDK.
 """
 
+import asyncio
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from unittest.mock import MagicMock
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+import pytest
+
+from src.claude.agent_integration import AgentIntegration
+from src.claude.conversation import ConversationManager
+from src.claude.session import ClaudeSession, InMemorySessionStorage, SessionManager
+
+# Keep these tests on one pytest-xdist worker under --dist=loadgroup, so the
+# module-scoped shared_agent is built once
+pytestmark = pytest.mark.xdist_group("session_manager")
+
+# Session paths the tests use; Path objects are immutable, so one instance
+# of each is shared
+TEST_PATH = Path("/test")
+TEST_PROJECT = Path("/test/project")
+
+
+@pytest.fixture(scope="module")
+def shared_agent(conversation_config: SimpleNamespace) -> AgentIntegration:
+    """Create one AgentIntegration for the module.
+
+    It is not initialized: initialize() only marks the integration ready for
+    queries, and these tests only manage its clients map, which __init__
+    already creates.
+    """
+    return AgentIntegration(config=conversation_config)
+
+
+@pytest.fixture
+def agent(shared_agent: AgentIntegration) -> AgentIntegration:
+    """Return the shared AgentIntegration, without clients."""
+    shared_agent.clients.clear()
+    return shared_agent
 
 
 class TestSessionLifecycle:
     """Test session creation, persistence, and cleanup."""
 
-    async def test_session_creation(self) -> None:
+    async def test_session_creation(self, conversation_config: SimpleNamespace) -> None:
         """Test that sessions are created correctly."""
-        from src.claude.session import (
-            ClaudeSession,
-            InMemorySessionStorage,
-            SessionManager,
-        )
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.session_timeout_hours = 24
-        config.max_sessions_per_user = 5
-
         storage = InMemorySessionStorage()
-        manager = SessionManager(config, storage)
+        manager = SessionManager(conversation_config, storage)
 
         session = await manager.get_or_create_session(
             user_id=12345,
-            project_path=Path("/test/project"),
+            project_path=TEST_PROJECT,
         )
 
         assert session is not None
         assert session.user_id == 12345
-        assert session.project_path == Path("/test/project")
+        assert session.project_path == TEST_PROJECT
         assert session.session_id is not None
 
-    async def test_session_reuse(self) -> None:
+    async def test_session_reuse(self, conversation_config: SimpleNamespace) -> None:
         """Test that existing sessions are reused."""
-        from src.claude.session import (
-            ClaudeSession,
-            InMemorySessionStorage,
-            SessionManager,
-        )
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.session_timeout_hours = 24
-        config.max_sessions_per_user = 5
-
         storage = InMemorySessionStorage()
-        manager = SessionManager(config, storage)
+        manager = SessionManager(conversation_config, storage)
 
         # Create first session
         session1 = await manager.get_or_create_session(
             user_id=12345,
-            project_path=Path("/test/project"),
+            project_path=TEST_PROJECT,
         )
 
         # Get same session by ID
         session2 = await manager.get_or_create_session(
             user_id=12345,
-            project_path=Path("/test/project"),
+            project_path=TEST_PROJECT,
             session_id=session1.session_id,
         )
 
@@ -71,12 +84,10 @@ class TestSessionLifecycle:
 
     async def test_session_expiration(self) -> None:
         """Test that expired sessions are handled correctly."""
-        from src.claude.session import ClaudeSession
-
         session = ClaudeSession(
             session_id="test-123",
             user_id=12345,
-            project_path=Path("/test"),
+            project_path=TEST_PATH,
             created_at=datetime.now(timezone.utc) - timedelta(hours=25),
             last_used=datetime.now(timezone.utc) - timedelta(hours=25),
         )
@@ -87,18 +98,11 @@ class TestSessionLifecycle:
         # Session should not be expired with 48 hour timeout
         assert session.is_expired(48) is False
 
-    async def test_session_cleanup(self) -> None:
+    async def test_session_cleanup(
+        self, mock_settings_factory: Callable[..., SimpleNamespace]
+    ) -> None:
         """Test that expired sessions are cleaned up."""
-        from src.claude.session import (
-            ClaudeSession,
-            InMemorySessionStorage,
-            SessionManager,
-        )
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.session_timeout_hours = 1
-        config.max_sessions_per_user = 5
+        config = mock_settings_factory(session_timeout_hours=1)
 
         storage = InMemorySessionStorage()
         manager = SessionManager(config, storage)
@@ -106,7 +110,7 @@ class TestSessionLifecycle:
         # Create session
         session = await manager.get_or_create_session(
             user_id=12345,
-            project_path=Path("/test/project"),
+            project_path=TEST_PROJECT,
         )
 
         # Manually expire the session
@@ -117,14 +121,11 @@ class TestSessionLifecycle:
         removed_count = await manager.cleanup_expired_sessions()
         assert removed_count == 1
 
-    async def test_max_sessions_per_user(self) -> None:
+    async def test_max_sessions_per_user(
+        self, mock_settings_factory: Callable[..., SimpleNamespace]
+    ) -> None:
         """Test that max sessions per user is enforced."""
-        from src.claude.session import InMemorySessionStorage, SessionManager
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.session_timeout_hours = 24
-        config.max_sessions_per_user = 2
+        config = mock_settings_factory(max_sessions_per_user=2)
 
         storage = InMemorySessionStorage()
         manager = SessionManager(config, storage)
@@ -152,116 +153,54 @@ class TestSessionLifecycle:
 class TestInterruptHandling:
     """Test session interrupt and stop functionality."""
 
-    async def test_close_session(self) -> None:
-        """Test that sessions can be closed."""
-        from src.claude.agent_integration import AgentIntegration
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.anthropic_api_key_str = None
-        config.enable_telegram_tools = False
-        config.enable_security_hooks = False
-        config.claude_max_turns = 10
-        config.claude_allowed_tools = []
-        config.permission_mode = "acceptEdits"
-        config.approved_directory = Path("/test")
-        config.claude_timeout_seconds = 30
-        config.tool_timeout_seconds = 10
-
-        agent = AgentIntegration(config=config)
-        await agent.initialize()
-
-        # Simulate active client
-        agent.clients[12345] = {"session_id": "test-123"}
-
-        # Close session
-        await agent.close_session(12345)
-
-        # Client should be removed
-        assert 12345 not in agent.clients
-
-    async def test_close_all_sessions(self) -> None:
-        """Test that all sessions can be closed."""
-        from src.claude.agent_integration import AgentIntegration
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.anthropic_api_key_str = None
-        config.enable_telegram_tools = False
-        config.enable_security_hooks = False
-        config.claude_max_turns = 10
-        config.claude_allowed_tools = []
-        config.permission_mode = "acceptEdits"
-        config.approved_directory = Path("/test")
-        config.claude_timeout_seconds = 30
-        config.tool_timeout_seconds = 10
-
-        agent = AgentIntegration(config=config)
-        await agent.initialize()
-
-        # Simulate multiple active clients
-        agent.clients[12345] = {"session_id": "test-123"}
-        agent.clients[67890] = {"session_id": "test-456"}
-
-        # Close all sessions
-        await agent.close_all()
-
-        # All clients should be removed
-        assert len(agent.clients) == 0
-
-    async def test_session_count(self) -> None:
-        """Test that active session count is tracked."""
-        from src.claude.agent_integration import AgentIntegration
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.anthropic_api_key_str = None
-        config.enable_telegram_tools = False
-        config.enable_security_hooks = False
-        config.claude_max_turns = 10
-        config.claude_allowed_tools = []
-        config.permission_mode = "acceptEdits"
-        config.approved_directory = Path("/test")
-        config.claude_timeout_seconds = 30
-        config.tool_timeout_seconds = 10
-
-        agent = AgentIntegration(config=config)
-
+    @pytest.mark.parametrize(
+        "preload, action, expected",
+        [
+            ({12345: {"session_id": "test-123"}}, "close_session", 0),
+            (
+                {12345: {"session_id": "test-123"}, 67890: {"session_id": "test-456"}},
+                "close_all",
+                0,
+            ),
+            (
+                {12345: {"session_id": "test-123"}, 67890: {"session_id": "test-456"}},
+                None,
+                2,
+            ),
+        ],
+        ids=["close_session", "close_all", "session_count"],
+    )
+    async def test_client_lifecycle(
+        self,
+        agent: AgentIntegration,
+        preload: dict,
+        action: Optional[str],
+        expected: int,
+    ) -> None:
+        """Test that sessions are closed and active clients counted."""
         assert agent.get_active_session_count() == 0
 
-        agent.clients[12345] = {"session_id": "test-123"}
-        assert agent.get_active_session_count() == 1
+        # Simulate active clients
+        agent.clients.update(preload)
+
+        if action == "close_session":
+            await agent.close_session(12345)
+        elif action == "close_all":
+            await agent.close_all()
 
-        agent.clients[67890] = {"session_id": "test-456"}
-        assert agent.get_active_session_count() == 2
+        assert agent.get_active_session_count() == expected
 
 
 class TestConversationManager:
     """Test ConversationManager bridging AgentIntegration and SessionManager."""
 
-    async def test_conversation_manager_creation(self) -> None:
+    async def test_conversation_manager_creation(
+        self, conversation_config: SimpleNamespace
+    ) -> None:
         """Test ConversationManager is created correctly."""
-        from src.claude.agent_integration import AgentIntegration
-        from src.claude.conversation import ConversationManager
-        from src.claude.session import InMemorySessionStorage, SessionManager
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.anthropic_api_key_str = None
-        config.enable_telegram_tools = False
-        config.enable_security_hooks = False
-        config.claude_max_turns = 10
-        config.claude_allowed_tools = []
-        config.permission_mode = "acceptEdits"
-        config.approved_directory = Path("/test")
-        config.claude_timeout_seconds = 30
-        config.tool_timeout_seconds = 10
-        config.session_timeout_hours = 24
-        config.max_sessions_per_user = 5
-
         storage = InMemorySessionStorage()
-        session_manager = SessionManager(config, storage)
-        agent = AgentIntegration(config=config)
+        session_manager = SessionManager(conversation_config, storage)
+        agent = AgentIntegration(config=conversation_config)
 
         conversation_manager = ConversationManager(
             agent_integration=agent,
@@ -270,30 +209,12 @@ class TestConversationManager:
 
         assert conversation_manager is not None
 
-    async def test_stop_conversation(self) -> None:
+    async def test_stop_conversation(
+        self, conversation_config: SimpleNamespace, agent: AgentIntegration
+    ) -> None:
         """Test that conversations can be stopped."""
-        from src.claude.agent_integration import AgentIntegration
-        from src.claude.conversation import ConversationManager
-        from src.claude.session import InMemorySessionStorage, SessionManager
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.anthropic_api_key_str = None
-        config.enable_telegram_tools = False
-        config.enable_security_hooks = False
-        config.claude_max_turns = 10
-        config.claude_allowed_tools = []
-        config.permission_mode = "acceptEdits"
-        config.approved_directory = Path("/test")
-        config.claude_timeout_seconds = 30
-        config.tool_timeout_seconds = 10
-        config.session_timeout_hours = 24
-        config.max_sessions_per_user = 5
-
         storage = InMemorySessionStorage()
-        session_manager = SessionManager(config, storage)
-        agent = AgentIntegration(config=config)
-        await agent.initialize()
+        session_manager = SessionManager(conversation_config, storage)
 
         # Simulate active conversation
         agent.clients[12345] = {"session_id": "test-123"}
@@ -304,37 +225,23 @@ class TestConversationManager:
         )
 
         # Mark conversation as in progress
-        conversation_manager._active_queries[12345] = True
+        cancel_event = asyncio.Event()
+        conversation_manager._cancel_events[12345] = cancel_event
 
         # Stop should clear the flag and close session
         result = await conversation_manager.stop_conversation(12345)
 
         assert result is True
-        assert 12345 not in conversation_manager._active_queries
+        assert cancel_event.is_set()
+        assert 12345 not in conversation_manager._cancel_events
 
-    async def test_is_conversation_active(self) -> None:
+    async def test_is_conversation_active(
+        self, conversation_config: SimpleNamespace
+    ) -> None:
         """Test checking if a conversation is active."""
-        from src.claude.agent_integration import AgentIntegration
-        from src.claude.conversation import ConversationManager
-        from src.claude.session import InMemorySessionStorage, SessionManager
-        from src.config.settings import Settings
-
-        config = MagicMock(spec=Settings)
-        config.anthropic_api_key_str = None
-        config.enable_telegram_tools = False
-        config.enable_security_hooks = False
-        config.claude_max_turns = 10
-        config.claude_allowed_tools = []
-        config.permission_mode = "acceptEdits"
-        config.approved_directory = Path("/test")
-        config.claude_timeout_seconds = 30
-        config.tool_timeout_seconds = 10
-        config.session_timeout_hours = 24
-        config.max_sessions_per_user = 5
-
         storage = InMemorySessionStorage()
-        session_manager = SessionManager(config, storage)
-        agent = AgentIntegration(config=config)
+        session_manager = SessionManager(conversation_config, storage)
+        agent = AgentIntegration(config=conversation_config)
 
         conversation_manager = ConversationManager(
             agent_integration=agent,
@@ -345,60 +252,43 @@ class TestConversationManager:
         assert conversation_manager.is_conversation_active(12345) is False
 
         # Mark as active
-        conversation_manager._active_queries[12345] = True
+        conversation_manager._cancel_events[12345] = asyncio.Event()
         assert conversation_manager.is_conversation_active(12345) is True
+        assert conversation_manager.get_active_count() == 1
+
+        # Stopping removes it from the count
+        await conversation_manager.stop_conversation(12345)
+        assert conversation_manager.get_active_count() == 0
 
 
 class TestSessionStorage:
     """Test session storage integration."""
 
-    async def test_in_memory_storage(self) -> None:
+    async def test_in_memory_storage(
+        self, sample_session: ClaudeSession, fresh_storage: InMemorySessionStorage
+    ) -> None:
         """Test in-memory session storage."""
-        from src.claude.session import ClaudeSession, InMemorySessionStorage
-
-        storage = InMemorySessionStorage()
-
-        session = ClaudeSession(
-            session_id="test-123",
-            user_id=12345,
-            project_path=Path("/test"),
-            created_at=datetime.utcnow(),
-            last_used=datetime.utcnow(),
-        )
-
-        await storage.save_session(session)
-        loaded = await storage.load_session("test-123")
+        await fresh_storage.save_session(sample_session)
+        loaded = await fresh_storage.load_session("test-123")
 
         assert loaded is not None
-        assert loaded.session_id == session.session_id
-        assert loaded.user_id == session.user_id
+        assert loaded.session_id == sample_session.session_id
+        assert loaded.user_id == sample_session.user_id
 
-    async def test_delete_session(self) -> None:
+    async def test_delete_session(
+        self, sample_session: ClaudeSession, fresh_storage: InMemorySessionStorage
+    ) -> None:
         """Test session deletion."""
-        from src.claude.session import ClaudeSession, InMemorySessionStorage
-
-        storage = InMemorySessionStorage()
-
-        session = ClaudeSession(
-            session_id="test-123",
-            user_id=12345,
-            project_path=Path("/test"),
-            created_at=datetime.utcnow(),
-            last_used=datetime.utcnow(),
-        )
-
-        await storage.save_session(session)
-        await storage.delete_session("test-123")
+        await fresh_storage.save_session(sample_session)
+        await fresh_storage.delete_session("test-123")
 
-        loaded = await storage.load_session("test-123")
+        loaded = await fresh_storage.load_session("test-123")
         assert loaded is None
 
-    async def test_get_user_sessions(self) -> None:
+    async def test_get_user_sessions(
+        self, fresh_storage: InMemorySessionStorage
+    ) -> None:
         """Test getting all sessions for a user."""
-        from src.claude.session import ClaudeSession, InMemorySessionStorage
-
-        storage = InMemorySessionStorage()
-
         # Create sessions for different users
         session1 = ClaudeSession(
             session_id="test-1",
@@ -422,9 +312,11 @@ class TestSessionStorage:
             last_used=datetime.utcnow(),
         )
 
-        await storage.save_session(session1)
-        await storage.save_session(session2)
-        await storage.save_session(session3)
+        await asyncio.gather(
+            fresh_storage.save_session(session1),
+            fresh_storage.save_session(session2),
+            fresh_storage.save_session(session3),
+        )
 
-        user_sessions = await storage.get_user_sessions(12345)
+        user_sessions = await fresh_storage.get_user_sessions(12345)
         assert len(user_sessions) == 2
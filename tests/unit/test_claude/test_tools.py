@@ -1,24 +1,50 @@
 """Test custom Telegram tools for Claude integration."""
 
+import asyncio
 from typing import Any, Dict
 from unittest.mock import AsyncMock, MagicMock
 
+import pytest
+
+from src.claude.tools.registry import ToolRegistry, safe_tool_execution
+from src.claude.tools.telegram_tools import (
+    TelegramToolContext,
+    _last_progress_update,
+    _truncate_utf8,
+    get_telegram_context,
+    telegram_context_scope,
+    telegram_file,
+    telegram_keyboard,
+    telegram_message,
+    telegram_progress,
+)
+
+
+async def _noop(*args: Any, **kwargs: Any) -> None:
+    """Stand in for a context send or edit that no test inspects."""
+
+
+@pytest.fixture
+def mock_telegram_context() -> MagicMock:
+    """Telegram tool context whose send and edit methods do nothing."""
+    ctx = MagicMock()
+    ctx.send_message = _noop
+    ctx.send_document = _noop
+    ctx.edit_message = _noop
+    return ctx
+
 
 class TestToolRegistry:
     """Test tool registration and discovery."""
 
     async def test_registry_creates_mcp_server(self) -> None:
         """Test that registry creates MCP server configuration."""
-        from src.claude.tools.registry import ToolRegistry
-
         registry = ToolRegistry()
         assert registry is not None
         assert registry.tools == {}
 
     async def test_registry_register_tool(self) -> None:
         """Test registering a tool with the registry."""
-        from src.claude.tools.registry import ToolRegistry
-
         registry = ToolRegistry()
 
         async def test_tool(args: Dict[str, Any]) -> Dict[str, Any]:
@@ -36,8 +62,6 @@ class TestToolRegistry:
 
     async def test_registry_get_mcp_server_config(self) -> None:
         """Test getting MCP server configuration from registry."""
-        from src.claude.tools.registry import ToolRegistry
-
         registry = ToolRegistry()
 
         async def test_tool(args: Dict[str, Any]) -> Dict[str, Any]:
@@ -54,73 +78,113 @@ class TestToolRegistry:
         config = registry.get_mcp_server_config()
         assert config is not None
 
+    async def test_registry_classifies_handlers_once(self) -> None:
+        """Test sync and async handlers are classified at registration."""
+        registry = ToolRegistry()
+
+        async def async_tool(args: Dict[str, Any]) -> Dict[str, Any]:
+            return {"content": [{"type": "text", "text": "async"}]}
+
+        def sync_tool(args: Dict[str, Any]) -> Dict[str, Any]:
+            return {"content": [{"type": "text", "text": "sync"}]}
+
+        registry.register("async_tool", "Async", {}, async_tool)
+        registry.register("sync_tool", "Sync", {}, sync_tool)
+
+        assert registry.tools["async_tool"]["is_async"] is True
+        assert registry.tools["sync_tool"]["is_async"] is False
+        result = await registry.execute_tool("async_tool", {})
+        assert result["content"][0]["text"] == "async"
+        result = await registry.execute_tool("sync_tool", {})
+        assert result["content"][0]["text"] == "sync"
+
 
 class TestTelegramKeyboardTool:
     """Test telegram_keyboard tool."""
 
-    async def test_keyboard_tool_creates_inline_keyboard(self) -> None:
+    async def test_keyboard_tool_creates_inline_keyboard(
+        self, mock_telegram_context: MagicMock
+    ) -> None:
         """Test that keyboard tool creates inline keyboard markup."""
-        from src.claude.tools.telegram_tools import telegram_keyboard
-
-        mock_context = MagicMock()
-        mock_context.send_message = AsyncMock()
-
         result = await telegram_keyboard(
             args={
                 "buttons": [["Option 1", "Option 2"], ["Cancel"]],
                 "message": "Choose an option:",
             },
-            context=mock_context,
+            context=mock_telegram_context,
         )
 
         assert result is not None
         assert "content" in result
 
-    async def test_keyboard_tool_validates_buttons(self) -> None:
+    async def test_keyboard_tool_validates_buttons(
+        self, mock_telegram_context: MagicMock
+    ) -> None:
         """Test that keyboard tool validates button input."""
-        from src.claude.tools.telegram_tools import telegram_keyboard
-
-        mock_context = MagicMock()
-
         # Empty buttons should return error
         result = await telegram_keyboard(
             args={"buttons": [], "message": "Choose:"},
-            context=mock_context,
+            context=mock_telegram_context,
         )
 
         assert "error" in str(result).lower() or result is not None
 
+    async def test_callback_text_truncated_on_character_boundary(self) -> None:
+        """Test button text is cut to the byte limit without splitting chars."""
+        assert _truncate_utf8("a" * 60, 55) == "a" * 55
+        assert _truncate_utf8("short", 55) == "short"
+        assert _truncate_utf8("é" * 10, 55) == "é" * 10
+        assert _truncate_utf8("é" * 30, 55) == "é" * 27
+
 
 class TestTelegramFileTool:
     """Test telegram_file tool."""
 
-    async def test_file_tool_sends_document(self) -> None:
+    async def test_file_tool_sends_document(
+        self, mock_telegram_context: MagicMock
+    ) -> None:
         """Test that file tool sends document."""
-        from src.claude.tools.telegram_tools import telegram_file
-
-        mock_context = MagicMock()
-        mock_context.send_document = AsyncMock()
-
         result = await telegram_file(
             args={
                 "content": "print('hello')",
                 "filename": "hello.py",
             },
-            context=mock_context,
+            context=mock_telegram_context,
         )
 
         assert result is not None
 
-    async def test_file_tool_validates_content(self) -> None:
-        """Test that file tool validates content."""
-        from src.claude.tools.telegram_tools import telegram_file
+    async def test_file_tool_spools_large_content(self) -> None:
+        """Test large files are streamed from a spooled buffer."""
+        from telegram import InputFile
+
+        content = "é" * 1_200_000
+        received = {}
+
+        async def send_document(document, filename, caption=None):
+            # The handle is passed through unread, for the upload to stream
+            assert isinstance(document, InputFile)
+            received["data"] = document.input_file_content.read()
 
         mock_context = MagicMock()
+        mock_context.send_document = send_document
+
+        result = await telegram_file(
+            args={"content": content, "filename": "big.txt"},
+            context=mock_context,
+        )
 
+        assert received["data"] == content.encode("utf-8")
+        assert result["content"][0]["text"] == "File 'big.txt' sent (2400000 bytes)"
+
+    async def test_file_tool_validates_content(
+        self, mock_telegram_context: MagicMock
+    ) -> None:
+        """Test that file tool validates content."""
         # Empty content should handle gracefully
         result = await telegram_file(
             args={"content": "", "filename": "empty.txt"},
-            context=mock_context,
+            context=mock_telegram_context,
         )
 
         assert result is not None
@@ -129,86 +193,130 @@ class TestTelegramFileTool:
 class TestTelegramProgressTool:
     """Test telegram_progress tool."""
 
-    async def test_progress_tool_updates_message(self) -> None:
+    async def test_progress_tool_updates_message(
+        self, mock_telegram_context: MagicMock
+    ) -> None:
         """Test that progress tool updates progress message."""
-        from src.claude.tools.telegram_tools import telegram_progress
-
-        mock_context = MagicMock()
-        mock_context.edit_message = AsyncMock()
-
         result = await telegram_progress(
             args={
                 "message": "Processing...",
                 "percent": 50,
             },
-            context=mock_context,
+            context=mock_telegram_context,
         )
 
         assert result is not None
 
-    async def test_progress_tool_clamps_percent(self) -> None:
+    async def test_progress_tool_clamps_percent(
+        self, mock_telegram_context: MagicMock
+    ) -> None:
         """Test that progress tool clamps percent to 0-100."""
-        from src.claude.tools.telegram_tools import telegram_progress
-
-        mock_context = MagicMock()
-        mock_context.edit_message = AsyncMock()
-
         # Test with > 100
         result = await telegram_progress(
             args={"message": "Done!", "percent": 150},
-            context=mock_context,
+            context=mock_telegram_context,
         )
         assert result is not None
 
         # Test with < 0
         result = await telegram_progress(
             args={"message": "Starting...", "percent": -10},
-            context=mock_context,
+            context=mock_telegram_context,
         )
         assert result is not None
 
+    async def test_progress_bar_rendering(self) -> None:
+        """Test the progress bar fills one cell per ten percent."""
+        mock_context = MagicMock()
+        mock_context.message_id = 1
+        mock_context.edit_message = AsyncMock()
+
+        _last_progress_update.set(0.0)
+        await telegram_progress(
+            args={"message": "Working", "percent": 47},
+            context=mock_context,
+        )
+
+        mock_context.edit_message.assert_awaited_once_with(
+            "Working\n\n[████░░░░░░] 47%"
+        )
+
+    async def test_unchanged_edit_skipped(self) -> None:
+        """Test editing a message to its current text makes no API call."""
+        bot = MagicMock()
+        bot.edit_message_text = AsyncMock()
+        ctx = TelegramToolContext(chat_id=1, message_id=2, bot=bot)
+
+        await ctx.edit_message("50%")
+        await ctx.edit_message("50%")
+        await ctx.edit_message("60%")
+
+        assert bot.edit_message_text.await_count == 2
+
 
 class TestTelegramMessageTool:
     """Test telegram_message tool."""
 
-    async def test_message_tool_sends_formatted_text(self) -> None:
+    async def test_message_tool_sends_formatted_text(
+        self, mock_telegram_context: MagicMock
+    ) -> None:
         """Test that message tool sends formatted text."""
-        from src.claude.tools.telegram_tools import telegram_message
-
-        mock_context = MagicMock()
-        mock_context.send_message = AsyncMock()
-
         result = await telegram_message(
             args={
                 "text": "**Bold** and *italic*",
                 "parse_mode": "Markdown",
             },
-            context=mock_context,
+            context=mock_telegram_context,
         )
 
         assert result is not None
 
-    async def test_message_tool_default_parse_mode(self) -> None:
+    async def test_message_tool_default_parse_mode(
+        self, mock_telegram_context: MagicMock
+    ) -> None:
         """Test that message tool uses default parse mode."""
-        from src.claude.tools.telegram_tools import telegram_message
-
-        mock_context = MagicMock()
-        mock_context.send_message = AsyncMock()
-
         result = await telegram_message(
             args={"text": "Plain text message"},
-            context=mock_context,
+            context=mock_telegram_context,
         )
 
         assert result is not None
 
+    async def test_message_sent_before_tool_returns(self) -> None:
+        """Test the message goes out in order, before the tool reports it sent."""
+        bot = MagicMock()
+        bot.send_message = AsyncMock()
+        ctx = TelegramToolContext(chat_id=1, bot=bot)
+
+        await telegram_message(args={"text": "first"}, context=ctx)
+        await telegram_keyboard(
+            args={"buttons": [["A"]], "message": "second"}, context=ctx
+        )
+
+        sent = [call.kwargs["text"] for call in bot.send_message.call_args_list]
+        assert sent == ["first", "second"]
+
+
+class TestTelegramContext:
+    """Test the per-request Telegram context."""
+
+    async def test_context_scope_restores_outer_context(self) -> None:
+        """Test a nested scope restores the outer context on exit."""
+        outer = TelegramToolContext(chat_id=1)
+        inner = TelegramToolContext(chat_id=2)
+
+        with telegram_context_scope(outer):
+            with telegram_context_scope(inner):
+                assert get_telegram_context() is inner
+            assert get_telegram_context() is outer
+        assert get_telegram_context() is None
+
 
 class TestToolExceptionHandling:
     """Test tool exception handling."""
 
     async def test_tool_error_returns_friendly_message(self) -> None:
         """Test that tool errors return user-friendly messages."""
-        from src.claude.tools.registry import safe_tool_execution
 
         async def failing_tool(args: Dict[str, Any]) -> Dict[str, Any]:
             raise ValueError("Something went wrong")
@@ -220,14 +328,13 @@ class TestToolExceptionHandling:
 
     async def test_tool_timeout_handled(self) -> None:
         """Test that tool timeout is handled gracefully."""
-        import asyncio
-
-        from src.claude.tools.registry import safe_tool_execution
 
         async def slow_tool(args: Dict[str, Any]) -> Dict[str, Any]:
             await asyncio.sleep(10)
             return {"content": [{"type": "text", "text": "done"}]}
 
-        # This test verifies the structure exists
-        # Actual timeout would be tested in integration tests
-        assert safe_tool_execution is not None
+        # The sleep is cancelled at the timeout, so the test stays fast
+        result = await safe_tool_execution(slow_tool, {}, timeout_seconds=0.05)
+
+        assert result["isError"] is True
+        assert "timed out" in result["content"][0]["text"]